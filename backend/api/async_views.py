@@ -0,0 +1,55 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.urls import URLPattern
+
+from .db import check_connections
+
+# Маршруты чтения, которые в режиме ASGI обслуживаются асинхронно
+ASYNC_ROUTES = (
+    'recipes-list',
+    'recipes-detail',
+    'ingredients-list',
+    'ingredients-detail',
+    'tags-list',
+    'tags-detail',
+)
+
+
+def run_view(view, request, *args, **kwargs):
+    """Выполняем view в потоке пула со своим соединением к базе"""
+    close_old_connections()
+    check_connections()
+    try:
+        return view(request, *args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """Асинхронная обёртка над view DRF.
+
+    В Django 3.2 нет асинхронного ORM, поэтому обработчик выполняется в
+    общем пуле потоков, а цикл событий принимает запрос и отдаёт ответ,
+    не занимая поток на время работы с медленным клиентом.
+    """
+    offloaded = sync_to_async(run_view, thread_sensitive=False)
+
+    async def wrapper(request, *args, **kwargs):
+        return await offloaded(view, request, *args, **kwargs)
+
+    return functools.update_wrapper(wrapper, view)
+
+
+def async_urls(patterns):
+    """Заменяем view маршрутов из ASYNC_ROUTES асинхронными"""
+    return [
+        URLPattern(
+            pattern.pattern,
+            async_view(pattern.callback),
+            pattern.default_args,
+            pattern.name,
+        ) if pattern.name in ASYNC_ROUTES else pattern
+        for pattern in patterns
+    ]
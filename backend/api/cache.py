@@ -0,0 +1,125 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from .db import replica_lag
+
+NAMESPACES = ('tags', 'ingredients', 'recipes')
+
+
+def _version_key(namespace):
+    return f'api:version:{namespace}'
+
+
+def get_version(namespace):
+    """Текущая версия данных пространства имён кеша"""
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        # Начинаем со времени, чтобы после вытеснения ключа версии
+        # не попасть на старые ответы с той же версией.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(namespaces):
+    for namespace in namespaces:
+        try:
+            cache.incr(_version_key(namespace))
+        except ValueError:
+            cache.add(_version_key(namespace), time.time_ns(), None)
+
+
+def bump_version(*namespaces):
+    """Сбрасываем кеш пространств имён после фиксации транзакции.
+
+    С репликой сбрасываем ещё раз, когда она догонит основную базу:
+    ответы и ETag, собранные с отстающей реплики под новой версией,
+    иначе жили бы до следующего изменения.
+    """
+    def bump():
+        _bump(namespaces)
+        lag = replica_lag()
+        if lag:
+            timer = threading.Timer(lag, _bump, (namespaces,))
+            timer.daemon = True
+            timer.start()
+    transaction.on_commit(bump)
+
+
+def get_user_version(user_id):
+    """Версия связей пользователя: подписок, избранного и корзины"""
+    return get_version(f'user:{user_id}')
+
+
+def bump_user_version(user_id):
+    bump_version(f'user:{user_id}')
+
+
+def _increment(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def cache_stats():
+    """Счётчики попаданий и промахов по пространствам имён"""
+    keys = [
+        f'api:stats:{kind}:{namespace}'
+        for namespace in NAMESPACES for kind in ('hit', 'miss')
+    ]
+    values = cache.get_many(keys)
+    return {
+        namespace: {
+            kind: values.get(f'api:stats:{kind}:{namespace}', 0)
+            for kind in ('hit', 'miss')
+        }
+        for namespace in NAMESPACES
+    }
+
+
+class CachedResponseMixin:
+    """Кешируем ответы list и retrieve.
+
+    Ключ включает версию пространства имён, которую сигналы моделей
+    увеличивают при изменениях, поэтому старые ответы просто перестают
+    читаться и вытесняются по таймауту.
+    """
+    cache_namespace = None
+    cache_anonymous_only = False
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_cache_key(self, request):
+        url = hashlib.md5(
+            request.build_absolute_uri().encode()
+        ).hexdigest()
+        version = get_version(self.cache_namespace)
+        return f'api:response:{self.cache_namespace}:{version}:{url}'
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if self.cache_anonymous_only and request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            _increment(f'api:stats:hit:{self.cache_namespace}')
+            return Response(data)
+        _increment(f'api:stats:miss:{self.cache_namespace}')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.API_CACHE_TIMEOUT)
+        return response
@@ -0,0 +1,79 @@
+import hashlib
+
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from .cache import get_user_version, get_version
+
+
+class ConditionalGetMixin:
+    """ETag и Last-Modified для list и retrieve.
+
+    ETag строится из версий данных, а не из тела ответа, поэтому на
+    совпавший If-None-Match отвечаем 304 до выборки и сериализации.
+    """
+    etag_namespaces = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_etag_parts(self, request, **kwargs):
+        parts = [request.get_full_path()]
+        parts += [str(get_version(name)) for name in self.etag_namespaces]
+        if request.user.is_authenticated:
+            parts.append(str(get_user_version(request.user.id)))
+        return parts
+
+    def get_last_modified(self, request, **kwargs):
+        return None
+
+    def get_response_last_modified(self, request, **kwargs):
+        """Last-Modified только для анонимов.
+
+        Ответ пользователю зависит ещё и от его избранного, корзины и
+        подписок, а дата их изменения не хранится; для него остаётся
+        ETag с версией пользователя.
+        """
+        if request.user.is_authenticated:
+            return None
+        return self.get_last_modified(request, **kwargs)
+
+    def is_not_modified(self, request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            return '*' in etags or etag in etags
+        if_modified_since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', '')
+        )
+        return bool(
+            last_modified and if_modified_since
+            and int(last_modified.timestamp()) <= if_modified_since
+        )
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        parts = self.get_etag_parts(request, **kwargs)
+        etag = '"{}"'.format(
+            hashlib.md5(':'.join(parts).encode()).hexdigest()
+        )
+        last_modified = self.get_response_last_modified(request, **kwargs)
+        if self.is_not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        patch_vary_headers(response, ('Authorization',))
+        return response
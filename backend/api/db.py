@@ -0,0 +1,93 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from rest_framework.permissions import SAFE_METHODS
+
+REPLICA = 'replica'
+
+# Чтение с реплики разрешено только внутри view с ReplicaReadMixin
+read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+def check_connections(**kwargs):
+    """Закрываем постоянные соединения, которые перестали отвечать.
+
+    В Django 3.2 нет CONN_HEALTH_CHECKS, поэтому проверяем соединения в
+    начале запроса, чтобы не получить ошибку на первом же запросе.
+    """
+    for connection in connections.all():
+        if (connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                and connection.connection is not None
+                and not connection.in_atomic_block
+                and not connection.is_usable()):
+            connection.close()
+
+
+def replica_lag():
+    """Сколько секунд реплика может отставать от основной базы"""
+    if REPLICA in settings.DATABASES:
+        return settings.DB_REPLICA_PIN_SECONDS
+    return 0
+
+
+def _pin_key(user_id):
+    return f'db:primary:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """После записи читаем данные пользователя с основной базы"""
+    if replica_lag():
+        cache.set(_pin_key(user_id), 1, replica_lag())
+
+
+def is_pinned_to_primary(user):
+    return user.is_authenticated and cache.get(_pin_key(user.id)) is not None
+
+
+class ReplicaRouter:
+    """Чтение безопасных запросов с реплики, всё остальное - с основной.
+
+    Реплика используется, только если она описана в DATABASES и view
+    включил read_from_replica; миграции применяются к основной базе.
+    """
+
+    def db_for_read(self, model, **hints):
+        if read_from_replica.get() and REPLICA in settings.DATABASES:
+            return REPLICA
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaReadMixin:
+    """GET, HEAD и OPTIONS view читают с реплики.
+
+    Аутентификация идёт до переключения, поэтому только что выданный
+    токен ищется на основной базе. Пользователь, который недавно что-то
+    менял, читает с основной базы, пока реплика не догонит.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        token = read_from_replica.set(False)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            read_from_replica.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method not in SAFE_METHODS:
+            if request.user.is_authenticated:
+                pin_to_primary(request.user.id)
+        elif (REPLICA in settings.DATABASES
+              and not is_pinned_to_primary(request.user)):
+            read_from_replica.set(True)
@@ -0,0 +1,63 @@
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+
+CSV_HEADER = ('Ингредиент', 'Количество', 'Единица измерения')
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: отдаёт строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def txt_lines(items):
+    for item in items:
+        yield (f"{item['ingredient__name']}\t"
+               f"{item['amount']}\t"
+               f"{item['ingredient__measurement_unit']}\n")
+
+
+def csv_lines(items):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for item in items:
+        yield writer.writerow((
+            item['ingredient__name'],
+            item['amount'],
+            item['ingredient__measurement_unit'],
+        ))
+
+
+def json_lines(items):
+    separator = '[\n'
+    for item in items:
+        yield separator + json.dumps({
+            'name': item['ingredient__name'],
+            'amount': item['amount'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+        }, ensure_ascii=False)
+        separator = ',\n'
+    yield '[]\n' if separator == '[\n' else '\n]\n'
+
+
+EXPORT_FORMATS = {
+    'txt': ('text/plain', txt_lines),
+    'csv': ('text/csv', csv_lines),
+    'json': ('application/json', json_lines),
+}
+
+
+def stream_shopping_list(queryset, export_format, chunk_size=500):
+    """Отдаём список покупок потоком, читая строки курсором на сервере"""
+    content_type, render = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(
+        render(queryset.iterator(chunk_size=chunk_size)),
+        content_type=f'{content_type}; charset=utf-8',
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="cart.{export_format}"'
+    )
+    return response
@@ -1,15 +1,35 @@
+from django.conf import settings
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django_filters.rest_framework import FilterSet, filters
 from rest_framework import filters as r_f_f
 
-from recipes.models import Recipe, Tag
+from recipes.models import Recipe, RecipeIngredient, Tag
 from users.models import User
 
+from .search import ingredient_index
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
+
 
 class RecipeFilter(FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
-        queryset=Tag.objects.all()
+        queryset=Tag.objects.all(),
+        method='tags_filter'
+    )
+    ingredients = NumberInFilter(
+        method='ingredients_filter'
+    )
+    ingredients_min = filters.NumberFilter(
+        method='ingredients_min_filter',
+        min_value=1
+    )
+    exclude_ingredients = NumberInFilter(
+        method='exclude_ingredients_filter'
     )
     author = filters.ModelChoiceFilter(
         queryset=User.objects.all()
@@ -20,6 +40,61 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='is_in_shopping_cart_filter'
     )
+    search = filters.CharFilter(
+        method='search_filter'
+    )
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'popular'),),
+        method='ordering_filter'
+    )
+
+    def tags_filter(self, queryset, name, value):
+        """Любой из тегов; EXISTS вместо JOIN не даёт дублей без DISTINCT"""
+        if not value:
+            return queryset
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'),
+            tag__in=value
+        )))
+
+    def ingredients_filter(self, queryset, name, value):
+        """Все ингредиенты из списка или не меньше ingredients_min из них"""
+        if not value:
+            return queryset
+        ingredient_ids = set(value)
+        minimum = self.form.cleaned_data.get('ingredients_min')
+        if minimum is None:
+            for ingredient_id in ingredient_ids:
+                queryset = queryset.filter(Exists(
+                    RecipeIngredient.objects.filter(
+                        recipe=OuterRef('pk'),
+                        ingredient_id=ingredient_id
+                    )
+                ))
+            return queryset
+        matched = RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk'),
+            ingredient_id__in=ingredient_ids
+        ).order_by().values('recipe').annotate(
+            total=Count('pk')
+        ).values('total')
+        return queryset.annotate(
+            matched_ingredients=Coalesce(Subquery(matched), 0)
+        ).filter(
+            matched_ingredients__gte=min(minimum, len(ingredient_ids))
+        ).order_by('-matched_ingredients', '-pub_date')
+
+    def ingredients_min_filter(self, queryset, name, value):
+        """Учитывается в ingredients_filter"""
+        return queryset
+
+    def exclude_ingredients_filter(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.exclude(Exists(RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk'),
+            ingredient_id__in=value
+        )))
 
     def is_favorited_filter(self, queryset, name, value):
         if value:
@@ -31,10 +106,30 @@ class RecipeFilter(FilterSet):
             return queryset.filter(carts__user=self.request.user)
         return queryset
 
+    def search_filter(self, queryset, name, value):
+        if value.strip():
+            return queryset.search(value.strip())
+        return queryset
+
+    def ordering_filter(self, queryset, name, value):
+        if value == 'popular':
+            return queryset.popular()
+        return queryset
+
     class Meta:
         model = Recipe
         fields = ('tags', 'author')
 
 
-class NameSearcher(r_f_f.SearchFilter):
+class IngredientSearcher(r_f_f.BaseFilterBackend):
+    """Поиск ингредиентов по началу названия через индекс в памяти"""
     search_param = 'name'
+
+    def filter_queryset(self, request, queryset, view):
+        prefix = request.query_params.get(self.search_param, '').strip()
+        if not prefix or view.action != 'list':
+            return queryset
+        return ingredient_index.search(
+            prefix,
+            limit=settings.INGREDIENT_SEARCH_LIMIT,
+        )
@@ -0,0 +1,148 @@
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.utils import timezone
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image, ImageOps, features
+from rest_framework import serializers
+
+from recipes.models import Recipe
+
+from .cache import bump_version
+
+logger = logging.getLogger(__name__)
+
+if features.check('webp'):
+    THUMBNAIL_FORMAT, THUMBNAIL_EXTENSION = 'WEBP', 'webp'
+else:
+    THUMBNAIL_FORMAT, THUMBNAIL_EXTENSION = 'JPEG', 'jpg'
+
+image_field = Recipe._meta.get_field('image')
+executor = ThreadPoolExecutor(
+    max_workers=max(settings.RECIPE_IMAGE_WORKERS, 1),
+    thread_name_prefix='recipe-images',
+)
+
+
+class RecipeImageField(Base64ImageField):
+    """Base64-изображение рецепта.
+
+    Слишком большие строки отклоняются до декодирования, размеры
+    проверяются по заголовку. Имя файла - хеш содержимого, поэтому
+    повторная загрузка того же изображения переиспользует файл.
+    """
+
+    def to_internal_value(self, data):
+        max_length = settings.RECIPE_IMAGE_MAX_BYTES * 4 // 3 + 100
+        if isinstance(data, str) and len(data) > max_length:
+            raise ValidationError(
+                f'image must be at most '
+                f'{settings.RECIPE_IMAGE_MAX_BYTES} bytes'
+            )
+        file = super().to_internal_value(data)
+        max_side = settings.RECIPE_IMAGE_MAX_SIDE
+        if max(file.image.size) > max_side:
+            raise ValidationError(
+                f'image sides must be at most {max_side} pixels'
+            )
+        name = image_field.generate_filename(None, file.name)
+        if image_field.storage.exists(name):
+            return name
+        return file
+
+    def get_file_name(self, decoded_file):
+        return hashlib.sha256(decoded_file).hexdigest()
+
+
+class ImageURLField(serializers.Field):
+    """URL сохранённого изображения без обращений к хранилищу.
+
+    Адрес собирается из имени файла и MEDIA_CDN_URL (или MEDIA_URL),
+    поэтому на странице из сотни рецептов хранилище не опрашивается.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        return super().get_attribute(instance).name
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        if settings.MEDIA_CDN_URL:
+            return f'{settings.MEDIA_CDN_URL.rstrip("/")}/{quote(value)}'
+        url = f'{settings.MEDIA_URL}{quote(value)}'
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
+def thumbnail_name(image_name, size):
+    path = PurePosixPath(image_name)
+    return f'{path.parent}/thumbs/{path.stem}_{size}.{THUMBNAIL_EXTENSION}'
+
+
+def make_thumbnails(image_name):
+    """Создаём недостающие миниатюры, возвращаем имя самой маленькой"""
+    storage = image_field.storage
+    sizes = sorted(settings.RECIPE_THUMBNAIL_SIZES)
+    missing = [
+        (size, thumbnail_name(image_name, size)) for size in sizes
+        if not storage.exists(thumbnail_name(image_name, size))
+    ]
+    if missing:
+        with storage.open(image_name) as file:
+            image = ImageOps.exif_transpose(Image.open(file))
+            image.load()
+        if image.mode not in ('RGB', 'RGBA') or THUMBNAIL_FORMAT == 'JPEG':
+            image = image.convert('RGB')
+        for size, name in missing:
+            thumbnail = image.copy()
+            thumbnail.thumbnail((size, size))
+            buffer = BytesIO()
+            thumbnail.save(buffer, THUMBNAIL_FORMAT, quality=80)
+            storage.save(name, ContentFile(buffer.getvalue()))
+    return thumbnail_name(image_name, sizes[0])
+
+
+def process_recipe_image(image_name):
+    thumbnail = make_thumbnails(image_name)
+    # updated_at входит в ETag карточки рецепта
+    Recipe.objects.filter(image=image_name).update(
+        image_thumb=thumbnail, updated_at=timezone.now()
+    )
+    bump_version('recipes')
+
+
+def _process_logged(image_name):
+    """Ошибка миниатюр не должна ронять уже сохранённый рецепт"""
+    try:
+        process_recipe_image(image_name)
+    except Exception:
+        logger.exception('thumbnails for %s failed', image_name)
+
+
+def _process_in_worker(image_name):
+    try:
+        _process_logged(image_name)
+    finally:
+        connection.close()
+
+
+def schedule_recipe_image(image_name):
+    """Обрабатываем изображение в пуле потоков, вне цикла запроса"""
+    if settings.RECIPE_IMAGE_WORKERS:
+        executor.submit(_process_in_worker, image_name)
+    else:
+        _process_logged(image_name)
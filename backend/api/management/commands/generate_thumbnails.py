@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+
+from api.images import process_recipe_image
+
+
+class Command(BaseCommand):
+    help = 'Generate missing thumbnails for recipe images.'
+
+    def handle(self, *args, **kwargs):
+        names = Recipe.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).distinct().order_by()
+        processed = 0
+        for name in names.iterator():
+            try:
+                process_recipe_image(name)
+                processed += 1
+            except OSError as error:
+                self.stderr.write(f'{name}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'thumbnails ready for {processed} images'
+        ))
@@ -0,0 +1,94 @@
+import os
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from .cache import cache_stats
+
+REQUEST_LATENCY = Histogram(
+    'foodgram_request_duration_seconds',
+    'Время ответа API по view и action',
+    ('view', 'method', 'status'),
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10),
+)
+REQUEST_QUERIES = Histogram(
+    'foodgram_request_queries',
+    'Число SQL-запросов на один ответ API',
+    ('view',),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+REQUEST_DB_TIME = Counter(
+    'foodgram_request_db_seconds',
+    'Суммарное время SQL-запросов по view',
+    ('view',),
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    'foodgram_requests_in_progress',
+    'Обрабатываемые сейчас запросы',
+    multiprocess_mode='livesum',
+)
+
+
+class CacheCollector:
+    """Попадания и промахи кеша ответов API.
+
+    Счётчики лежат в кеше Django и читаются при каждом опросе; общими
+    для всех воркеров они становятся с общим кешем (Redis).
+    """
+
+    def collect(self):
+        hits = CounterMetricFamily(
+            'foodgram_api_cache_hits', 'Попадания в кеш ответов',
+            labels=('namespace',),
+        )
+        misses = CounterMetricFamily(
+            'foodgram_api_cache_misses', 'Промахи кеша ответов',
+            labels=('namespace',),
+        )
+        ratio = GaugeMetricFamily(
+            'foodgram_api_cache_hit_ratio', 'Доля попаданий в кеш ответов',
+            labels=('namespace',),
+        )
+        for namespace, stats in cache_stats().items():
+            total = stats['hit'] + stats['miss']
+            hits.add_metric((namespace,), stats['hit'])
+            misses.add_metric((namespace,), stats['miss'])
+            ratio.add_metric(
+                (namespace,), stats['hit'] / total if total else 0
+            )
+        yield hits
+        yield misses
+        yield ratio
+
+
+cache_registry = CollectorRegistry(auto_describe=False)
+cache_registry.register(CacheCollector())
+
+
+def view_name(request, view_func):
+    """Метка view: класс и action для DRF, иначе имя функции"""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__name__', 'unknown')
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+def render_metrics():
+    """Метрики всех воркеров в текстовом формате Prometheus.
+
+    В режиме нескольких процессов (PROMETHEUS_MULTIPROC_DIR) значения
+    собираются из файлов общего каталога, иначе - из памяти процесса.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return (
+        generate_latest(registry) + generate_latest(cache_registry),
+        CONTENT_TYPE_LATEST,
+    )
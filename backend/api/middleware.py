@@ -0,0 +1,196 @@
+import asyncio
+import functools
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .metrics import (REQUEST_DB_TIME, REQUEST_LATENCY, REQUEST_QUERIES,
+                      REQUESTS_IN_PROGRESS, view_name)
+
+logger = logging.getLogger(__name__)
+
+# Счётчики запросов текущего запроса. Контекст переходит вместе с
+# запросом в потоки sync_to_async, поэтому счёт идёт и там
+active_recorders = ContextVar('active_recorders', default=())
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def normalize_sql(sql):
+    """Приводим запросы с разными параметрами к одному виду"""
+    return LITERAL.sub('?', IN_LIST.sub('IN (...)', sql))
+
+
+class QueryRecorder:
+    """Обёртка execute_wrapper: считает запросы и время в базе"""
+
+    def __init__(self, keep_statements=True):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter() if keep_statements else None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            if self.statements is not None:
+                self.statements[normalize_sql(sql)] += 1
+
+    def repeated(self, limit):
+        return [
+            {'sql': sql, 'count': count}
+            for sql, count in self.statements.most_common(limit)
+            if count > 1
+        ]
+
+
+def dispatch_queries(execute, sql, params, many, context):
+    """Постоянная обёртка соединения: передаёт запрос активным счётчикам"""
+    for recorder in reversed(active_recorders.get()):
+        execute = functools.partial(recorder, execute)
+    return execute(sql, params, many, context)
+
+
+def install_dispatcher(connection, **kwargs):
+    if dispatch_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(dispatch_queries)
+
+
+def enable_recording():
+    """Подключаем dispatch_queries ко всем новым и открытым соединениям"""
+    connection_created.connect(
+        install_dispatcher, dispatch_uid='api.middleware.install_dispatcher'
+    )
+    for connection in connections.all():
+        install_dispatcher(connection)
+
+
+@contextmanager
+def record_queries(recorder):
+    """Считаем запросы в этом контексте, в каком бы потоке они ни шли"""
+    token = active_recorders.set(active_recorders.get() + (recorder,))
+    try:
+        yield
+    finally:
+        active_recorders.reset(token)
+
+
+class RequestTimingMiddleware:
+    """Число запросов, время в базе, во view и на рендер, размер ответа.
+
+    Включается переменной REQUEST_TIMING, иначе Django исключает
+    middleware из цепочки. Метрики уходят в заголовок Server-Timing и
+    в журнал строкой JSON; при превышении порогов пишем предупреждение
+    с самыми частыми запросами - так видны N+1.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING:
+            raise MiddlewareNotUsed
+        enable_recording()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with record_queries(recorder):
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+        view_start = getattr(request, '_timing_view_start', start)
+        view_end = getattr(request, '_timing_view_end', start + total)
+        # DRF сериализует данные внутри view, рендер JSON идёт после
+        metrics = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'db_ms': round(recorder.duration * 1000, 2),
+            'view_ms': round((view_end - view_start) * 1000, 2),
+            'render_ms': round((start + total - view_end) * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'size': (
+                None if response.streaming else len(response.content)
+            ),
+        }
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={metrics["db_ms"]};desc="{recorder.count} queries"',
+            f'view;dur={metrics["view_ms"]}',
+            f'render;dur={metrics["render_ms"]}',
+            f'total;dur={metrics["total_ms"]}',
+        ))
+        if (metrics['total_ms'] > settings.REQUEST_TIMING_SLOW_MS
+                or recorder.count > settings.REQUEST_TIMING_MAX_QUERIES):
+            metrics['repeated'] = recorder.repeated(
+                settings.REQUEST_TIMING_TOP_QUERIES
+            )
+            logger.warning(json.dumps(metrics, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(metrics, ensure_ascii=False))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._timing_view_start = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        request._timing_view_end = time.perf_counter()
+        return response
+
+
+class PrometheusMiddleware:
+    """Гистограммы времени ответа и числа запросов к базе по view.
+
+    Отключается переменной METRICS_ENABLED=0. Значения пишутся в
+    счётчики prometheus_client и отдаются эндпоинтом /api/metrics.
+    Работает и в синхронной, и в асинхронной цепочке, не добавляя
+    переходов между потоками под ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        enable_recording()
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        recorder = QueryRecorder(keep_statements=False)
+        start = time.perf_counter()
+        with record_queries(recorder), REQUESTS_IN_PROGRESS.track_inprogress():
+            response = self.get_response(request)
+        self.observe(request, response, recorder, start)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder(keep_statements=False)
+        start = time.perf_counter()
+        with record_queries(recorder), REQUESTS_IN_PROGRESS.track_inprogress():
+            response = await self.get_response(request)
+        self.observe(request, response, recorder, start)
+        return response
+
+    def observe(self, request, response, recorder, start):
+        match = request.resolver_match
+        view = view_name(request, match.func) if match else 'unmatched'
+        REQUEST_LATENCY.labels(
+            view, request.method, response.status_code
+        ).observe(time.perf_counter() - start)
+        REQUEST_QUERIES.labels(view).observe(recorder.count)
+        REQUEST_DB_TIME.labels(view).inc(recorder.duration)
@@ -1,5 +1,130 @@
-from rest_framework.pagination import PageNumberPagination
+import functools
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+from .cache import get_user_version, get_version
+
+
+class CountingPaginator(Paginator):
+    """Paginator с оценкой или кешированием COUNT(*).
+
+    Для выборки без фильтров на PostgreSQL берём оценку reltuples из
+    статистики, если она выше порога. Остальные подсчёты кешируются по
+    тексту запроса на короткое время; префикс ключа содержит версии
+    данных, поэтому изменения сбрасывают кеш сразу.
+    """
+
+    def __init__(self, object_list, per_page, cache_prefix=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.cache_prefix = cache_prefix
+
+    def estimate_count(self):
+        query = self.object_list.query
+        connection = connections[self.object_list.db]
+        if (connection.vendor != 'postgresql' or query.where
+           or query.distinct or query.low_mark or query.high_mark):
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [self.object_list.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        estimate = int(row[0]) if row else 0
+        if estimate < settings.PAGINATION_ESTIMATE_THRESHOLD:
+            return None
+        return estimate
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return super().count
+        estimate = self.estimate_count()
+        if estimate is not None:
+            return estimate
+        if self.cache_prefix is None:
+            return super().count
+        signature = hashlib.md5(
+            str(self.object_list.query).encode()
+        ).hexdigest()
+        key = f'{self.cache_prefix}:{signature}'
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
 
 
 class LimitPaginator(PageNumberPagination):
     page_size_query_param = 'limit'
+
+    def get_count_cache_prefix(self, request, view):
+        namespace = getattr(view, 'cache_namespace', None)
+        if namespace is None:
+            return None
+        prefix = f'api:count:{namespace}:{get_version(namespace)}'
+        if request.user.is_authenticated:
+            prefix += f':{get_user_version(request.user.id)}'
+        return prefix
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.django_paginator_class = functools.partial(
+            CountingPaginator,
+            cache_prefix=self.get_count_cache_prefix(request, view),
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+
+class LimitCursorPaginator(CursorPagination):
+    """Курсорная пагинация: без OFFSET и COUNT, цена не зависит от глубины"""
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+
+class FeedPaginator(LimitPaginator):
+    """Постраничная пагинация с включаемым курсорным режимом.
+
+    Курсорный режим включается параметром ?paginate=cursor, а ссылки
+    next/previous в нём содержат ?cursor=. Порядок задаётся атрибутом
+    cursor_ordering представления; выборку с другим явным порядком
+    (популярность, релевантность поиска) курсором не листаем, а
+    отвечаем 400, чтобы порядок не терялся молча.
+    """
+    mode_query_param = 'paginate'
+    cursor_query_param = 'cursor'
+    cursor_paginator = None
+
+    def is_cursor_mode(self, request):
+        return (self.cursor_query_param in request.query_params
+                or request.query_params.get(self.mode_query_param)
+                == 'cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_cursor_mode(request):
+            return super().paginate_queryset(queryset, request, view)
+        ordering = tuple(getattr(
+            view, 'cursor_ordering', LimitCursorPaginator.ordering
+        ))
+        if (queryset.query.order_by
+           and tuple(queryset.query.order_by) != ordering):
+            raise ValidationError({
+                'errors': 'cursor pagination does not support '
+                          'this ordering, use page numbers'
+            })
+        self.cursor_paginator = LimitCursorPaginator()
+        self.cursor_paginator.ordering = ordering
+        return self.cursor_paginator.paginate_queryset(
+            queryset, request, view
+        )
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
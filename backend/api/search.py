@@ -0,0 +1,63 @@
+import bisect
+import threading
+import time
+
+from django.conf import settings
+
+from recipes.models import Ingredient
+
+
+def normalize(value):
+    """Приводим название к виду для сравнения: регистр и ё"""
+    return value.strip().casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """Отсортированный индекс названий ингредиентов в памяти процесса.
+
+    Поиск по префиксу делается двоичным поиском без обращения к БД.
+    Индекс строится при первом запросе, сбрасывается сигналами при
+    изменении ингредиентов и перестраивается не реже чем раз в ttl
+    секунд, чтобы изменения из других воркеров тоже доходили.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._data = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._data = None
+
+    def _build(self):
+        rows = sorted(
+            (normalize(name), name, unit, pk)
+            for pk, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            ).iterator()
+        )
+        keys = [row[0] for row in rows]
+        items = [
+            Ingredient(id=pk, name=name, measurement_unit=unit)
+            for _, name, unit, pk in rows
+        ]
+        return keys, items, time.monotonic()
+
+    def _get_data(self):
+        data = self._data
+        if data is None or time.monotonic() - data[2] > self.ttl:
+            with self._lock:
+                data = self._data
+                if data is None or time.monotonic() - data[2] > self.ttl:
+                    data = self._data = self._build()
+        return data
+
+    def search(self, prefix, limit):
+        keys, items, _ = self._get_data()
+        prefix = normalize(prefix)
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + '\uffff', lo=start)
+        return items[start:min(end, start + limit)]
+
+
+ingredient_index = IngredientIndex(ttl=settings.INGREDIENT_INDEX_TTL)
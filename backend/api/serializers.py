@@ -1,10 +1,15 @@
-from drf_extra_fields.fields import Base64ImageField
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
+from rest_framework.validators import UniqueTogetherValidator
 
-from recipes.models import (Ingredient, Recipe,
-                            RecipeIngredient, Tag, Cart, Favorite)
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingListItem, Tag)
 from users.models import Follow, User
 
+from .images import ImageURLField, RecipeImageField
+from .viewer import ViewerListSerializer, viewer_has
+
 
 class UserShowSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
@@ -19,15 +24,15 @@ class UserShowSerializer(serializers.ModelSerializer):
             'last_name',
             'is_subscribed',
         )
+        list_serializer_class = ViewerListSerializer
+
+    def register_viewer_ids(self, viewer, users):
+        viewer.register('follows', [user.pk for user in users])
 
     def get_is_subscribed(self, obj):
-        if (self.context.get('request')
-           and self.context['request'].user.is_authenticated):
-            return Follow.objects.filter(
-                follower=self.context['request'].user,
-                following=obj
-            ).exists()
-        return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return viewer_has(self.context, 'follows', obj.pk)
 
 
 class UserCreateSerializer(serializers.ModelSerializer):
@@ -75,6 +80,15 @@ class ChangePasswordSerializer(serializers.Serializer):
         return validated_data
 
 
+class RelationIdsSerializer(serializers.Serializer):
+    """Список id для пакетного добавления и удаления связей"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RELATIONS_BULK_LIMIT,
+    )
+
+
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
@@ -94,6 +108,12 @@ class IngredientShowSerializer(serializers.ModelSerializer):
             'name',
             'measurement_unit',
         )
+        validators = [
+            UniqueTogetherValidator(
+                queryset=Ingredient.objects.all(),
+                fields=('name', 'measurement_unit'),
+            )
+        ]
 
 
 class RecipeIngredientShowSerializer(serializers.ModelSerializer):
@@ -122,7 +142,8 @@ class RecipeShowSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     name = serializers.CharField()
-    image = Base64ImageField()
+    image = ImageURLField()
+    image_thumb = ImageURLField()
     text = serializers.CharField()
     cooking_time = serializers.CharField()
 
@@ -137,25 +158,27 @@ class RecipeShowSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_thumb',
             'text',
             'cooking_time',
         )
+        list_serializer_class = ViewerListSerializer
+
+    def register_viewer_ids(self, viewer, recipes):
+        recipe_ids = [recipe.pk for recipe in recipes]
+        viewer.register('favorites', recipe_ids)
+        viewer.register('carts', recipe_ids)
+        viewer.register('follows', [recipe.author_id for recipe in recipes])
 
     def get_is_favorited(self, obj):
-        if self.context.get('request').user.is_authenticated:
-            return Favorite.objects.filter(
-                user=self.context['request'].user,
-                recipe=obj
-            ).exists()
-        return False
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        return viewer_has(self.context, 'favorites', obj.pk)
 
     def get_is_in_shopping_cart(self, obj):
-        if self.context.get('request').user.is_authenticated:
-            return Cart.objects.filter(
-                user=self.context['request'].user,
-                recipe=obj
-            ).exists()
-        return False
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        return viewer_has(self.context, 'carts', obj.pk)
 
 
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
@@ -180,7 +203,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         many=True,
         required=True,
     )
-    image = Base64ImageField(required=True)
+    image = RecipeImageField(required=True)
     name = serializers.CharField(required=True)
     text = serializers.CharField(required=True)
     cooking_time = serializers.IntegerField(required=True)
@@ -205,6 +228,15 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 {'errors': 'ingredients must be unique'}
             )
+        found = Ingredient.objects.in_bulk(unique_ingredients)
+        missing = unique_ingredients - found.keys()
+        if missing:
+            raise serializers.ValidationError(
+                {'ingredients': 'ingredients do not exist: '
+                 + ', '.join(map(str, sorted(missing)))}
+            )
+        for item in obj['ingredients']:
+            item['ingredient'] = found[item['id']]
         tags = obj.get('tags')
         unique_tags = set(tags)
         if len(tags) != len(unique_tags):
@@ -221,11 +253,40 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         recipe.tags.set(tags)
         RecipeIngredient.objects.bulk_create(RecipeIngredient(
             recipe=recipe,
-            ingredient=Ingredient.objects.get(id=item['id']),
+            ingredient=item['ingredient'],
             amount=item['amount'])
             for item in ingredients
         )
 
+    def ingredients_update(self, ingredients, recipe):
+        """Меняем только добавленные, удалённые и изменённые ингредиенты"""
+        current = {
+            item.ingredient_id: item
+            for item in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        new = {item['id']: item for item in ingredients}
+        changed = []
+        for ingredient_id, item in current.items():
+            if (ingredient_id in new
+               and item.amount != new[ingredient_id]['amount']):
+                item.amount = new[ingredient_id]['amount']
+                changed.append(item)
+        RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        removed = current.keys() - new.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe,
+                ingredient_id__in=removed
+            ).delete()
+        RecipeIngredient.objects.bulk_create(RecipeIngredient(
+            recipe=recipe,
+            ingredient=item['ingredient'],
+            amount=item['amount'])
+            for ingredient_id, item in new.items()
+            if ingredient_id not in current
+        )
+
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
@@ -236,21 +297,22 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         self.tags_ingredients_setup(tags, ingredients, recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
+        cart_users = list(
+            instance.carts.values_list('user_id', flat=True)
+        )
+        ShoppingListItem.objects.remove_recipes([instance], cart_users)
         instance.image = validated_data.get('image', instance.image)
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get(
             'cooking_time', instance.cooking_time
         )
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-        RecipeIngredient.objects.filter(
-            recipe=instance,
-            ingredient__in=instance.ingredients.all()
-        ).delete()
-        self.tags_ingredients_setup(tags, ingredients, instance)
+        instance.tags.set(validated_data.pop('tags'))
+        self.ingredients_update(validated_data.pop('ingredients'), instance)
         instance.save()
+        ShoppingListItem.objects.add_recipes([instance], cart_users)
         return instance
 
     def to_representation(self, instance):
@@ -262,7 +324,8 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
 class RecipeSmallSerializer(serializers.ModelSerializer):
     name = serializers.ReadOnlyField()
-    image = Base64ImageField(read_only=True)
+    image = ImageURLField()
+    image_thumb = ImageURLField()
     cooking_time = serializers.ReadOnlyField()
 
     class Meta:
@@ -271,6 +334,7 @@ class RecipeSmallSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_thumb',
             'cooking_time',
         )
 
@@ -299,17 +363,17 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        return Follow.objects.filter(
-            follower=self.context['request'].user,
-            following=obj.following
-        ).exists()
+        """Подписка пользователя на автора известна по самой записи"""
+        return True
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = Recipe.objects.filter(author=obj.following)
-        if limit:
-            recipes = recipes[:int(limit)]
+        recipes = getattr(obj.following, 'latest_recipes', None)
+        if recipes is None:
+            request = self.context.get('request')
+            limit = request.GET.get('recipes_limit')
+            recipes = Recipe.objects.filter(author=obj.following)
+            if limit and limit.isdigit():
+                recipes = recipes[:int(limit)]
         serializer = RecipeSmallSerializer(
             recipes,
             many=True,
@@ -318,4 +382,4 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         return serializer.data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.following).count()
+        return obj.following.recipes_count
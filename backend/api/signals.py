@@ -0,0 +1,165 @@
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import Signal, receiver
+
+from recipes.models import (Cart, Favorite, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingListItem, Tag)
+from users.models import Follow, User
+
+from .cache import bump_user_version, bump_version
+from .db import check_connections, pin_to_primary
+from .images import schedule_recipe_image, thumbnail_name
+from .search import ingredient_index
+
+# Отправляются из api.utils с аргументами user и subjects - списком
+# объектов, связи с которыми созданы или удалены
+relation_created = Signal()
+relation_deleted = Signal()
+
+# Счётчики объекта subject, которые меняет связь с ним
+RELATION_COUNTERS = {
+    Favorite: 'favorites_count',
+    Cart: 'carts_count',
+    Follow: 'followers_count',
+}
+
+
+# Поле связи, указывающее на объект со счётчиком
+RELATION_SUBJECTS = {
+    Favorite: 'recipe',
+    Cart: 'recipe',
+    Follow: 'following',
+}
+
+# Поля пользователя, которые отдаются в составе рецепта
+AUTHOR_FIELDS = {'username', 'first_name', 'last_name', 'email'}
+
+
+def change_counter(model, pks, field, delta):
+    model.objects.filter(pk__in=pks).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+request_started.connect(check_connections)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags_cache(**kwargs):
+    bump_version('tags', 'recipes')
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients_cache(**kwargs):
+    bump_version('ingredients', 'recipes')
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipes_cache(**kwargs):
+    bump_version('recipes')
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_recipes_author(update_fields=None, **kwargs):
+    """Рецепты в ответах содержат автора; вход в систему их не меняет"""
+    if update_fields is None or set(update_fields) & AUTHOR_FIELDS:
+        bump_version('recipes')
+
+
+@receiver((relation_created, relation_deleted))
+def invalidate_user_relations(user, **kwargs):
+    bump_user_version(user.id)
+    pin_to_primary(user.id)
+
+
+@receiver(relation_created)
+def increment_relation_counter(sender, subjects, **kwargs):
+    if sender in RELATION_COUNTERS:
+        change_counter(
+            type(subjects[0]), [subject.pk for subject in subjects],
+            RELATION_COUNTERS[sender], 1
+        )
+
+
+@receiver(relation_deleted)
+def decrement_relation_counter(sender, subjects, **kwargs):
+    if sender in RELATION_COUNTERS:
+        change_counter(
+            type(subjects[0]), [subject.pk for subject in subjects],
+            RELATION_COUNTERS[sender], -1
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Cart)
+@receiver(post_delete, sender=Follow)
+def decrement_deleted_relation_counter(sender, instance, **kwargs):
+    """Счётчики связей, удалённых через ORM, например каскадом.
+
+    Переключение в api.utils удаляет связи SQL-запросом без post_delete
+    и уменьшает счётчики через relation_deleted, так что двойного учёта
+    нет.
+    """
+    subject = sender._meta.get_field(RELATION_SUBJECTS[sender])
+    change_counter(
+        subject.related_model, [getattr(instance, subject.attname)],
+        RELATION_COUNTERS[sender], -1
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(instance, **kwargs):
+    Recipe.objects.filter(pk=instance.pk).update_search_vector()
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(instance, **kwargs):
+    if not instance.image:
+        return
+    image_name = instance.image.name
+    thumbnail = thumbnail_name(
+        image_name, min(settings.RECIPE_THUMBNAIL_SIZES)
+    )
+    if instance.image_thumb.name != thumbnail:
+        transaction.on_commit(lambda: schedule_recipe_image(image_name))
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_counter(instance, created, **kwargs):
+    if created:
+        change_counter(User, [instance.author_id], 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_counter(instance, **kwargs):
+    change_counter(User, [instance.author_id], 'recipes_count', -1)
+
+
+@receiver(relation_created, sender=Cart)
+def add_to_shopping_list(user, subjects, **kwargs):
+    ShoppingListItem.objects.add_recipes(subjects, [user.id])
+
+
+@receiver(relation_deleted, sender=Cart)
+def remove_from_shopping_list(user, subjects, **kwargs):
+    ShoppingListItem.objects.remove_recipes(subjects, [user.id])
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_deleted_recipe_from_shopping_lists(instance, **kwargs):
+    ShoppingListItem.objects.remove_recipes(
+        [instance],
+        list(instance.carts.values_list('user_id', flat=True))
+    )
@@ -0,0 +1,125 @@
+import base64
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.models import (Cart, Favorite, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingListItem, Tag)
+from users.models import Follow, User
+
+from ..search import ingredient_index
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram-tests-')
+
+
+def image_bytes(color='red'):
+    """Маленькая картинка PNG"""
+    buffer = BytesIO()
+    Image.new('RGB', (8, 8), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def image_base64(color='red'):
+    """Картинка в формате, который принимает API"""
+    return ('data:image/png;base64,'
+            + base64.b64encode(image_bytes(color)).decode())
+
+
+@override_settings(
+    CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'foodgram-tests',
+    }},
+    MEDIA_ROOT=MEDIA_ROOT,
+    RECIPE_IMAGE_WORKERS=0,
+)
+class APITestCase(TestCase):
+    """Тестовая база и отдельный кеш, который чистится перед каждым тестом"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        ingredient_index.invalidate()
+        self.anonymous = APIClient(HTTP_HOST='localhost')
+
+    def client_for(self, user):
+        client = APIClient(HTTP_HOST='localhost')
+        client.force_authenticate(user)
+        return client
+
+
+def seed(users=50, recipes=300, ingredients=300):
+    """Пользователи, рецепты, подписки, избранное и корзина для замеров"""
+    User.objects.bulk_create(
+        User(
+            username=f'bench{i}',
+            email=f'bench{i}@example.com',
+            first_name='Bench',
+            last_name=str(i),
+        )
+        for i in range(users)
+    )
+    users = list(
+        User.objects.filter(username__startswith='bench').order_by('id')
+    )
+    Tag.objects.bulk_create(
+        Tag(name=f'bench tag {i}', color=f'#bb{i:04d}', slug=f'bench{i}')
+        for i in range(10)
+    )
+    tags = list(Tag.objects.filter(slug__startswith='bench'))
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'бенч {i:05d}', measurement_unit='г')
+        for i in range(ingredients)
+    )
+    ingredients = list(Ingredient.objects.filter(name__startswith='бенч'))
+    Recipe.objects.bulk_create(
+        Recipe(
+            author=users[i % len(users)],
+            name=f'bench recipe {i}',
+            text='bench',
+            image='uploads/recipes/bench.jpg',
+            cooking_time=i % 120 + 1,
+        )
+        for i in range(recipes)
+    )
+    recipes = list(
+        Recipe.objects.filter(name__startswith='bench').order_by('id')
+    )
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe=recipe, tag=tags[(i + k) % len(tags)])
+        for i, recipe in enumerate(recipes)
+        for k in range(3)
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            recipe=recipe,
+            ingredient=ingredients[(i * 7 + k) % len(ingredients)],
+            amount=k + 1,
+        )
+        for i, recipe in enumerate(recipes)
+        for k in range(8)
+    )
+    viewer = users[0]
+    Follow.objects.bulk_create(
+        Follow(follower=follower, following=following)
+        for follower in users[:20]
+        for following in users
+        if follower != following and following != users[1]
+    )
+    Favorite.objects.bulk_create(
+        Favorite(user=viewer, recipe=recipe) for recipe in recipes[1::3]
+    )
+    Cart.objects.bulk_create(
+        Cart(user=viewer, recipe=recipe) for recipe in recipes[2:200:2]
+    )
+    ShoppingListItem.objects.rebuild([viewer.id])
+    return users, tags, ingredients, recipes
@@ -0,0 +1,52 @@
+from recipes.models import Recipe
+from users.models import Follow, User
+
+from .base import APITestCase
+
+
+class RelationCounterTests(APITestCase):
+    """Счётчики подписчиков, избранного и корзины"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.fan, cls.other = (
+            User.objects.create(username=name, email=f'{name}@example.com')
+            for name in ('author', 'fan', 'other')
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author,
+            name='пирог',
+            text='печь',
+            image='uploads/recipes/pie.jpg',
+            cooking_time=30,
+        )
+        Follow.objects.create(follower=cls.other, following=cls.author)
+        User.objects.filter(pk=cls.author.pk).update(followers_count=1)
+
+    def relate(self, user, method='post'):
+        client = self.client_for(user)
+        recipe_url = f'/api/recipes/{self.recipe.id}/'
+        for url in (recipe_url + 'favorite/', recipe_url + 'shopping_cart/',
+                    f'/api/users/{self.author.id}/subscribe/'):
+            response = getattr(client, method)(url)
+            self.assertLess(response.status_code, 300, response.content)
+
+    def assertCounters(self, followers, favorites, carts):
+        self.author.refresh_from_db()
+        self.recipe.refresh_from_db()
+        self.assertEqual(
+            (self.author.followers_count, self.recipe.favorites_count,
+             self.recipe.carts_count),
+            (followers, favorites, carts),
+        )
+
+    def test_toggle(self):
+        self.relate(self.fan)
+        self.assertCounters(2, 1, 1)
+        self.relate(self.fan, 'delete')
+        self.assertCounters(1, 0, 0)
+
+    def test_cascade_delete(self):
+        self.relate(self.fan)
+        self.fan.delete()
+        self.assertCounters(1, 0, 0)
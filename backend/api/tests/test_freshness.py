@@ -0,0 +1,233 @@
+import json
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import update_last_login
+from django.utils.http import http_date
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+from .base import APITestCase, image_base64
+
+
+class FreshnessTests(APITestCase):
+    """После изменений API не отдаёт устаревшие данные"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@example.com'
+        )
+        cls.viewer = User.objects.create(
+            username='viewer', email='viewer@example.com'
+        )
+        cls.tag = Tag.objects.create(
+            name='обед', color='#00ff00', slug='lunch'
+        )
+        cls.flour = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+        cls.milk = Ingredient.objects.create(
+            name='молоко', measurement_unit='мл'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author,
+            name='блины',
+            text='жарить',
+            image='uploads/recipes/pancakes.jpg',
+            cooking_time=20,
+        )
+        cls.recipe.tags.set([cls.tag])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=cls.recipe, ingredient=cls.flour,
+                             amount=200),
+            RecipeIngredient(recipe=cls.recipe, ingredient=cls.milk,
+                             amount=500),
+        ])
+
+    def setUp(self):
+        super().setUp()
+        self.recipe_url = f'/api/recipes/{self.recipe.id}/'
+
+    def update_recipe(self, **changes):
+        data = {
+            'ingredients': [
+                {'id': self.flour.id, 'amount': 200},
+                {'id': self.milk.id, 'amount': 500},
+            ],
+            'tags': [self.tag.id],
+            'image': image_base64(),
+            'name': 'блины',
+            'text': 'жарить',
+            'cooking_time': 20,
+            **changes,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.author).put(
+                self.recipe_url, data, format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def shopping_list(self, user):
+        response = self.client_for(user).get(
+            '/api/recipes/download_shopping_cart/?type=json'
+        )
+        items = json.loads(b''.join(response.streaming_content))
+        return {item['name']: item['amount'] for item in items}
+
+    def test_shopping_list_follows_recipe_update(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client_for(self.viewer).post(
+                self.recipe_url + 'shopping_cart/'
+            )
+        self.assertEqual(
+            self.shopping_list(self.viewer), {'мука': 200, 'молоко': 500}
+        )
+        self.update_recipe(ingredients=[
+            {'id': self.flour.id, 'amount': 300},
+        ])
+        self.assertEqual(self.shopping_list(self.viewer), {'мука': 300})
+
+    def test_list_etag_changes_after_recipe_update(self):
+        response = self.anonymous.get('/api/recipes/')
+        etag = response['ETag']
+        self.update_recipe(name='оладьи')
+        response = self.anonymous.get(
+            '/api/recipes/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['results'][0]['name'], 'оладьи')
+
+    def test_detail_etag_changes_after_recipe_update(self):
+        etag = self.anonymous.get(self.recipe_url)['ETag']
+        self.update_recipe(name='оладьи')
+        response = self.anonymous.get(
+            self.recipe_url, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], 'оладьи')
+
+    def test_list_etag_changes_after_author_update(self):
+        etag = self.anonymous.get('/api/recipes/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.author).patch(
+                f'/api/users/{self.author.id}/', {'first_name': 'Иван'}
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        response = self.anonymous.get(
+            '/api/recipes/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data['results'][0]['author']['first_name'], 'Иван'
+        )
+
+    def test_anonymous_cache_after_author_update(self):
+        self.anonymous.get('/api/recipes/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client_for(self.author).patch(
+                f'/api/users/{self.author.id}/', {'last_name': 'Петров'}
+            )
+        response = self.anonymous.get('/api/recipes/')
+        self.assertEqual(
+            response.data['results'][0]['author']['last_name'], 'Петров'
+        )
+
+    def test_login_keeps_recipes_version(self):
+        etag = self.anonymous.get('/api/recipes/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            update_last_login(None, self.author)
+        response = self.anonymous.get(
+            '/api/recipes/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+
+    @mock.patch('api.cache.threading.Timer')
+    @mock.patch('api.cache.replica_lag', return_value=5)
+    def test_version_bumped_again_after_replica_lag(self, lag, timer):
+        self.update_recipe(name='оладьи')
+        # Ответ, собранный с отстающей реплики под новой версией
+        etag = self.anonymous.get('/api/recipes/')['ETag']
+        self.assertTrue(timer.call_args_list)
+        for call in timer.call_args_list:
+            delay, bump, args = call.args
+            self.assertEqual(delay, 5)
+            bump(*args)
+        response = self.anonymous.get(
+            '/api/recipes/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_detail_if_modified_since_after_favorite(self):
+        client = self.client_for(self.viewer)
+        response = client.get(self.recipe_url)
+        self.assertFalse(response.data['is_favorited'])
+        self.assertFalse(response.has_header('Last-Modified'))
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(self.recipe_url + 'favorite/')
+        response = client.get(
+            self.recipe_url,
+            HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60),
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_favorited'])
+
+    def test_anonymous_detail_if_modified_since(self):
+        response = self.anonymous.get(self.recipe_url)
+        response = self.anonymous.get(
+            self.recipe_url,
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+class PopularOrderingTests(APITestCase):
+    """Список ordering=popular догоняет счётчики не позже чем через TTL"""
+
+    url = '/api/recipes/?ordering=popular'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@example.com'
+        )
+        cls.fans = User.objects.bulk_create(
+            User(username=f'fan{i}', email=f'fan{i}@example.com')
+            for i in range(3)
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author,
+                name=f'пирог {i}',
+                text='печь',
+                image='uploads/recipes/pie.jpg',
+                cooking_time=30,
+                favorites_count=i,
+            )
+            for i in range(3)
+        ]
+
+    def order(self, response):
+        return [recipe['id'] for recipe in response.data['results']]
+
+    @mock.patch('time.time')
+    def test_order_follows_relation_counters(self, now):
+        now.return_value = 1_000_000.0
+        response = self.anonymous.get(self.url)
+        etag = response['ETag']
+        self.assertEqual(self.order(response)[0], self.recipes[2].id)
+        least_popular = self.recipes[0]
+        for fan in User.objects.filter(username__startswith='fan'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client_for(fan).post(
+                    f'/api/recipes/{least_popular.id}/shopping_cart/'
+                )
+        now.return_value += settings.POPULAR_ORDERING_TTL
+        response = self.anonymous.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.order(response)[0], least_popular.id)
+        response = self.anonymous.get(self.url)
+        self.assertEqual(self.order(response)[0], least_popular.id)
@@ -0,0 +1,50 @@
+from django.core.files.base import ContentFile
+
+from recipes.models import Recipe
+from users.models import User
+
+from ..images import image_field
+from .base import APITestCase, image_bytes
+
+
+class RecipeImageTests(APITestCase):
+    """Миниатюры строятся после сохранения рецепта"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@example.com'
+        )
+
+    def create_recipe(self, image, execute=True):
+        with self.captureOnCommitCallbacks(execute=execute) as callbacks:
+            recipe = Recipe.objects.create(
+                author=self.author,
+                name='пирог',
+                text='печь',
+                image=image,
+                cooking_time=30,
+            )
+        return recipe, callbacks
+
+    def test_detail_etag_changes_when_thumbnail_is_ready(self):
+        image = image_field.storage.save(
+            'uploads/recipes/pie.png', ContentFile(image_bytes())
+        )
+        recipe, callbacks = self.create_recipe(image, execute=False)
+        url = f'/api/recipes/{recipe.id}/'
+        response = self.anonymous.get(url)
+        self.assertIsNone(response.data['image_thumb'])
+        with self.captureOnCommitCallbacks(execute=True):
+            for callback in callbacks:
+                callback()
+        response = self.anonymous.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.data['image_thumb'])
+
+    def test_missing_image_is_logged(self):
+        with self.assertLogs('api.images', 'ERROR'):
+            recipe, _ = self.create_recipe('uploads/recipes/missing.png')
+        self.assertFalse(recipe.image_thumb)
@@ -0,0 +1,37 @@
+from django.test import override_settings
+
+from .base import APITestCase
+
+
+@override_settings(METRICS_ALLOWED_IPS=['10.0.0.2'], METRICS_TOKEN='secret')
+class MetricsAccessTests(APITestCase):
+    """Метрики Prometheus не видны посторонним"""
+
+    url = '/api/metrics'
+
+    def test_allowed_address(self):
+        response = self.anonymous.get(self.url, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'foodgram_', response.content)
+
+    def test_token(self):
+        response = self.anonymous.get(
+            self.url, REMOTE_ADDR='10.0.0.3',
+            HTTP_AUTHORIZATION='Bearer secret',
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_forbidden(self):
+        for headers in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'}):
+            with self.subTest(headers=headers):
+                response = self.anonymous.get(
+                    self.url, REMOTE_ADDR='10.0.0.3', **headers
+                )
+                self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_empty_token_is_disabled(self):
+        response = self.anonymous.get(
+            self.url, REMOTE_ADDR='10.0.0.3', HTTP_AUTHORIZATION='Bearer '
+        )
+        self.assertEqual(response.status_code, 403)
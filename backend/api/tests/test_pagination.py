@@ -0,0 +1,68 @@
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from users.models import Follow, User
+
+from .base import APITestCase
+
+
+class CursorPaginationTests(APITestCase):
+    """Курсор листает только в порядке cursor_ordering представления"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@example.com'
+        )
+        cls.viewer = User.objects.create(
+            username='viewer', email='viewer@example.com'
+        )
+        Follow.objects.create(follower=cls.viewer, following=cls.author)
+        cls.flour = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author,
+                name=f'пирог {i}',
+                text='печь',
+                image='uploads/recipes/pie.jpg',
+                cooking_time=30,
+                favorites_count=i,
+            )
+            for i in range(3)
+        ]
+        RecipeIngredient.objects.create(
+            recipe=cls.recipes[0], ingredient=cls.flour, amount=100
+        )
+
+    def test_default_ordering(self):
+        response = self.anonymous.get('/api/recipes/?paginate=cursor')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [recipe.id for recipe in reversed(self.recipes)],
+        )
+
+    def test_subscriptions(self):
+        response = self.client_for(self.viewer).get(
+            '/api/users/subscriptions/?paginate=cursor'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_custom_ordering_rejected(self):
+        # Поиск сортирует по релевантности только в PostgreSQL
+        for query in ('ordering=popular',
+                      f'ingredients={self.flour.id}&ingredients_min=1'):
+            with self.subTest(query=query):
+                response = self.anonymous.get(
+                    f'/api/recipes/?{query}&paginate=cursor'
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('errors', response.data)
+
+    def test_custom_ordering_with_page_numbers(self):
+        response = self.anonymous.get('/api/recipes/?ordering=popular')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [recipe.id for recipe in reversed(self.recipes)],
+        )
@@ -0,0 +1,92 @@
+from .base import APITestCase, seed
+
+PAGE_SIZE = 100
+
+
+class QueryBudgetTests(APITestCase):
+    """Число SQL-запросов основных эндпоинтов не зависит от размера страницы.
+
+    Тест выполняется внутри транзакции, поэтому SAVEPOINT и RELEASE
+    вложенных atomic() тоже попадают в счётчик.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        users, _, _, recipes = seed()
+        cls.viewer = users[0]
+        cls.author = users[1]
+        cls.recipe = recipes[0]
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.viewer)
+        self.recipe_url = f'/api/recipes/{self.recipe.id}/'
+        self.author_url = f'/api/users/{self.author.id}/'
+
+    def assertQueries(self, number, method, url):
+        with self.assertNumQueries(number):
+            response = method(url)
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, url)
+        return response
+
+    def test_recipes_list(self):
+        self.assertQueries(
+            5, self.client.get, f'/api/recipes/?limit={PAGE_SIZE}'
+        )
+
+    def test_recipes_list_anonymous(self):
+        self.assertQueries(
+            5, self.anonymous.get, f'/api/recipes/?limit={PAGE_SIZE}'
+        )
+
+    def test_recipes_list_cursor(self):
+        self.assertQueries(
+            4, self.client.get,
+            f'/api/recipes/?paginate=cursor&limit={PAGE_SIZE}'
+        )
+
+    def test_recipe_detail(self):
+        self.assertQueries(5, self.client.get, self.recipe_url)
+
+    def test_users_list(self):
+        self.assertQueries(
+            3, self.client.get, f'/api/users/?limit={PAGE_SIZE}'
+        )
+
+    def test_subscriptions(self):
+        self.assertQueries(
+            3, self.client.get,
+            f'/api/users/subscriptions/?limit={PAGE_SIZE}&recipes_limit=3'
+        )
+
+    def test_ingredients_search(self):
+        self.assertQueries(1, self.client.get, '/api/ingredients/?name=бенч')
+
+    def test_download_shopping_cart(self):
+        self.assertQueries(
+            1, self.client.get, '/api/recipes/download_shopping_cart/'
+        )
+
+    def test_favorite(self):
+        url = self.recipe_url + 'favorite/'
+        self.assertQueries(5, self.client.post, url)
+        self.assertQueries(5, self.client.delete, url)
+
+    def test_shopping_cart(self):
+        url = self.recipe_url + 'shopping_cart/'
+        self.assertQueries(8, self.client.post, url)
+        self.assertQueries(8, self.client.delete, url)
+
+    def test_subscribe(self):
+        url = self.author_url + 'subscribe/'
+        self.assertQueries(6, self.client.post, url)
+        self.assertQueries(5, self.client.delete, url)
+
+    def test_subscribe_self(self):
+        with self.assertNumQueries(0):
+            response = self.client.post(
+                f'/api/users/{self.viewer.id}/subscribe/'
+            )
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,151 @@
+import json
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingListItem)
+from users.models import User
+
+from .base import APITestCase
+
+
+class BulkRelationTests(APITestCase):
+    """Пакетные избранное, корзина и подписки: результат по каждому id"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@example.com'
+        )
+        cls.viewer = User.objects.create(
+            username='viewer', email='viewer@example.com'
+        )
+        flour = Ingredient.objects.create(name='мука', measurement_unit='г')
+        milk = Ingredient.objects.create(name='молоко', measurement_unit='мл')
+        cls.pie, cls.pancakes = (
+            Recipe.objects.create(
+                author=cls.author,
+                name=name,
+                text='готовить',
+                image='uploads/recipes/food.jpg',
+                cooking_time=30,
+            )
+            for name in ('пирог', 'блины')
+        )
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=cls.pie, ingredient=flour, amount=300),
+            RecipeIngredient(recipe=cls.pancakes, ingredient=flour,
+                             amount=200),
+            RecipeIngredient(recipe=cls.pancakes, ingredient=milk,
+                             amount=500),
+        ])
+        Favorite.objects.create(user=cls.viewer, recipe=cls.pancakes)
+        Recipe.objects.filter(pk=cls.pancakes.pk).update(favorites_count=1)
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.viewer)
+
+    def bulk(self, method, url, ids):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(
+                url, {'ids': ids}, format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        return {
+            result['id']: (result['status'], result['detail'])
+            for result in response.data['results']
+        }
+
+    def counters(self, field):
+        return dict(Recipe.objects.values_list('id', field))
+
+    def test_favorite(self):
+        url = '/api/recipes/favorite/'
+        results = self.bulk(
+            'post', url, [self.pie.id, self.pancakes.id, 999, self.pie.id]
+        )
+        self.assertEqual(results, {
+            self.pie.id: (200, 'relation created'),
+            self.pancakes.id: (400, 'relation already exists'),
+            999: (404, 'not found'),
+        })
+        self.assertEqual(
+            self.counters('favorites_count'),
+            {self.pie.id: 1, self.pancakes.id: 1},
+        )
+        results = self.bulk('delete', url, [self.pie.id, self.pancakes.id])
+        self.assertEqual(results, {
+            self.pie.id: (204, 'relation deleted'),
+            self.pancakes.id: (204, 'relation deleted'),
+        })
+        results = self.bulk('delete', url, [self.pie.id])
+        self.assertEqual(
+            results, {self.pie.id: (400, 'relation does not exist')}
+        )
+        self.assertEqual(
+            self.counters('favorites_count'),
+            {self.pie.id: 0, self.pancakes.id: 0},
+        )
+
+    def shopping_list(self):
+        return dict(ShoppingListItem.objects.filter(
+            user=self.viewer
+        ).values_list('ingredient__name', 'amount'))
+
+    def test_shopping_cart(self):
+        url = '/api/recipes/shopping_cart/'
+        results = self.bulk('post', url, [self.pie.id, self.pancakes.id])
+        self.assertEqual(
+            {status for status, _ in results.values()}, {200}
+        )
+        self.assertEqual(self.shopping_list(), {'мука': 500, 'молоко': 500})
+        self.assertEqual(
+            self.counters('carts_count'),
+            {self.pie.id: 1, self.pancakes.id: 1},
+        )
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/?type=json'
+        )
+        items = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(
+            {item['name']: item['amount'] for item in items},
+            {'мука': 500, 'молоко': 500},
+        )
+        self.bulk('delete', url, [self.pancakes.id])
+        self.assertEqual(self.shopping_list(), {'мука': 300})
+        self.assertEqual(
+            self.counters('carts_count'),
+            {self.pie.id: 1, self.pancakes.id: 0},
+        )
+
+    def test_subscribe(self):
+        results = self.bulk(
+            'post', '/api/users/subscribe/',
+            [self.viewer.id, self.author.id, 999],
+        )
+        self.assertEqual(results, {
+            self.viewer.id: (400, 'relation to yourself is not allowed'),
+            self.author.id: (200, 'relation created'),
+            999: (404, 'not found'),
+        })
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
+        results = self.bulk(
+            'delete', '/api/users/subscribe/', [self.author.id]
+        )
+        self.assertEqual(results, {self.author.id: (204, 'relation deleted')})
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
+
+    def test_invalid_ids(self):
+        for data in ({'ids': []}, {'ids': [0]}, {'ids': ['x']}, {}):
+            with self.subTest(data=data):
+                response = self.client.post(
+                    '/api/recipes/favorite/', data, format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+
+    def test_anonymous(self):
+        response = self.anonymous.post(
+            '/api/recipes/favorite/', {'ids': [self.pie.id]}, format='json'
+        )
+        self.assertEqual(response.status_code, 401)
@@ -1,7 +1,9 @@
+from django.conf import settings
 from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
 from . import views
+from .async_views import async_urls
 
 router = DefaultRouter()
 router.register(r'users', views.UserViewSet, basename='users')
@@ -13,9 +15,13 @@ router.register(
     basename='ingredients'
 )
 
+router_urls = router.urls
+if settings.ASYNC_VIEWS:
+    router_urls = async_urls(router_urls)
 
 urlpatterns = [
-    path('', include(router.urls)),
+    path('metrics', views.metrics, name='metrics'),
+    path('', include(router_urls)),
     path('auth/', include('djoser.urls')),
     re_path(r'auth/', include('djoser.urls.authtoken')),
 ]
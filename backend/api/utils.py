@@ -1,43 +1,170 @@
+import functools
+from collections import namedtuple
 
+from django.db import connection, transaction
+from django.utils import timezone
 from rest_framework import status
 
+from .signals import relation_created, relation_deleted
+
+SELF_RELATION_ERROR = 'relation to yourself is not allowed'
+
+RelationMeta = namedtuple(
+    'RelationMeta',
+    ('user_field', 'subject_field', 'auto_fields', 'insert', 'delete'),
+)
+
+
+@functools.lru_cache(maxsize=None)
+def relation_meta(model):
+    """Поля связи и заготовки SQL для неё, строятся один раз.
+
+    Вставка с ON CONFLICT DO NOTHING и удаление с RETURNING отвечают за
+    один запрос, поэтому повторный клик не доходит до IntegrityError.
+    """
+    quote = connection.ops.quote_name
+    user_field, subject_field = [
+        field for field in model._meta.concrete_fields if field.many_to_one
+    ]
+    auto_fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    table = quote(model._meta.db_table)
+    columns = [user_field, subject_field] + auto_fields
+    returning = (
+        f'RETURNING {quote(model._meta.pk.column)}, '
+        f'{quote(subject_field.column)}'
+    )
+    insert = (
+        f'INSERT INTO {table} '
+        f'({", ".join(quote(field.column) for field in columns)}) '
+        'VALUES {values} ON CONFLICT DO NOTHING ' + returning
+    )
+    delete = (
+        f'DELETE FROM {table} WHERE {quote(user_field.column)} = %s '
+        f'AND {quote(subject_field.column)} IN ({{values}}) ' + returning
+    )
+    return RelationMeta(user_field, subject_field, auto_fields, insert, delete)
+
+
+def insert_relations(model, user, subject_ids, now):
+    """Создаём связи одним запросом, возвращаем {id объекта: id связи}"""
+    meta = relation_meta(model)
+    extra = [
+        field.get_db_prep_save(now, connection) for field in meta.auto_fields
+    ]
+    row = f'({", ".join(["%s"] * (2 + len(extra)))})'
+    params = []
+    for subject_id in subject_ids:
+        params += [user.pk, subject_id] + extra
+    with connection.cursor() as cursor:
+        cursor.execute(
+            meta.insert.format(values=', '.join([row] * len(subject_ids))),
+            params,
+        )
+        return {subject_id: pk for pk, subject_id in cursor.fetchall()}
+
+
+def delete_relations(model, user, subject_ids):
+    """Удаляем связи одним запросом, возвращаем id затронутых объектов"""
+    meta = relation_meta(model)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            meta.delete.format(values=', '.join(['%s'] * len(subject_ids))),
+            [user.pk] + list(subject_ids),
+        )
+        return {subject_id for _, subject_id in cursor.fetchall()}
+
 
 def create_or_delete_relation(model, user, subject, request):
-    field_names = [field.name for field in model._meta.get_fields()]
-    user_field = field_names[1]
-    subject_field = field_names[2]
+    if type(subject) is type(user) and subject.pk == user.pk:
+        return {
+            'string': {'errors': SELF_RELATION_ERROR},
+            'status': status.HTTP_400_BAD_REQUEST,
+        }
     if request.method == 'POST':
-        try:
-            model.objects.get(**{user_field: user, subject_field: subject})
-            response = {
-                'string': {'detail': 'relation already exists'},
-                'status': status.HTTP_400_BAD_REQUEST,
-            }
-            return response
-        except model.DoesNotExist:
-            instance = model.objects.create(
-                **{user_field: user, subject_field: subject}
+        now = timezone.now()
+        with transaction.atomic():
+            created = insert_relations(model, user, [subject.pk], now)
+            if not created:
+                return {
+                    'string': {'detail': 'relation already exists'},
+                    'status': status.HTTP_400_BAD_REQUEST,
+                }
+            relation_created.send(
+                sender=model, user=user, subjects=[subject]
             )
-            response = {
-                'string': {'detail': 'relation created'},
-                'status': status.HTTP_200_OK,
-                'instance': instance,
-            }
-            return response
+        meta = relation_meta(model)
+        instance = model(
+            pk=created[subject.pk],
+            **{meta.user_field.name: user, meta.subject_field.name: subject},
+            **{field.name: now for field in meta.auto_fields},
+        )
+        return {
+            'string': {'detail': 'relation created'},
+            'status': status.HTTP_200_OK,
+            'instance': instance,
+        }
     if request.method == 'DELETE':
-        try:
-            instance = model.objects.get(
-                **{user_field: user, subject_field: subject}
+        with transaction.atomic():
+            if not delete_relations(model, user, [subject.pk]):
+                return {
+                    'string': {'errors': 'relation does not exist'},
+                    'status': status.HTTP_400_BAD_REQUEST,
+                }
+            relation_deleted.send(
+                sender=model, user=user, subjects=[subject]
+            )
+        return {
+            'string': {'detail': 'relation deleted'},
+            'status': status.HTTP_204_NO_CONTENT,
+        }
+
+
+def bulk_create_or_delete_relations(model, user, subject_ids, request):
+    """Связи со списком объектов: по одному запросу на проверку и запись.
+
+    Возвращаем результат по каждому id с тем же статусом и текстом,
+    что и у запроса к одному объекту.
+    """
+    subject_ids = list(dict.fromkeys(subject_ids))
+    subject_model = relation_meta(model).subject_field.related_model
+    subjects = subject_model.objects.in_bulk(subject_ids)
+
+    def is_self(pk):
+        return subject_model is type(user) and pk == user.pk
+
+    valid_ids = [
+        pk for pk in subject_ids if pk in subjects and not is_self(pk)
+    ]
+    with transaction.atomic():
+        if not valid_ids:
+            done = set()
+        elif request.method == 'POST':
+            done = insert_relations(model, user, valid_ids, timezone.now())
+            signal = relation_created
+        else:
+            done = delete_relations(model, user, valid_ids)
+            signal = relation_deleted
+        if done:
+            signal.send(
+                sender=model, user=user,
+                subjects=[subjects[pk] for pk in valid_ids if pk in done],
             )
-            instance.delete()
-            response = {
-                'string': {'detail': 'relation deleted'},
-                'status': status.HTTP_204_NO_CONTENT,
-            }
-            return response
-        except model.DoesNotExist:
-            response = {
-                'string': {'errors': 'relation does not exist'},
-                'status': status.HTTP_400_BAD_REQUEST,
-            }
-            return response
+    if request.method == 'POST':
+        success = (status.HTTP_200_OK, 'relation created')
+        failure = (status.HTTP_400_BAD_REQUEST, 'relation already exists')
+    else:
+        success = (status.HTTP_204_NO_CONTENT, 'relation deleted')
+        failure = (status.HTTP_400_BAD_REQUEST, 'relation does not exist')
+    results = []
+    for pk in subject_ids:
+        if pk not in subjects:
+            result = (status.HTTP_404_NOT_FOUND, 'not found')
+        elif is_self(pk):
+            result = (status.HTTP_400_BAD_REQUEST, SELF_RELATION_ERROR)
+        else:
+            result = success if pk in done else failure
+        results.append({'id': pk, 'status': result[0], 'detail': result[1]})
+    return results
@@ -0,0 +1,73 @@
+from django.db import models
+from rest_framework import serializers
+
+from recipes.models import Cart, Favorite
+from users.models import Follow
+
+# Вид связи: модель, поле пользователя и столбец объекта связи
+RELATIONS = {
+    'follows': (Follow, 'follower', 'following_id'),
+    'favorites': (Favorite, 'user', 'recipe_id'),
+    'carts': (Cart, 'user', 'recipe_id'),
+}
+
+
+class Viewer:
+    """Подписки, избранное и корзина текущего пользователя.
+
+    Живёт один запрос. Сериализаторы списков заранее регистрируют id
+    объектов страницы, и при первой проверке связи этого вида id
+    загружаются одним запросом, поэтому флаги is_* стоят не больше трёх
+    запросов на ответ при любой вложенности.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.pending = {kind: set() for kind in RELATIONS}
+        self.checked = {kind: set() for kind in RELATIONS}
+        self.found = {kind: set() for kind in RELATIONS}
+
+    def register(self, kind, ids):
+        self.pending[kind].update(ids)
+
+    def has(self, kind, pk):
+        if not self.user.is_authenticated:
+            return False
+        if pk not in self.checked[kind]:
+            ids = (self.pending[kind] - self.checked[kind]) | {pk}
+            model, user_field, subject_field = RELATIONS[kind]
+            self.found[kind].update(model.objects.filter(**{
+                user_field: self.user,
+                f'{subject_field}__in': ids,
+            }).values_list(subject_field, flat=True))
+            self.checked[kind].update(ids)
+            self.pending[kind].clear()
+        return pk in self.found[kind]
+
+
+def get_viewer(context):
+    """Viewer запроса из контекста сериализатора или None без запроса"""
+    request = context.get('request')
+    if request is None:
+        return None
+    if not hasattr(request, '_viewer'):
+        request._viewer = Viewer(request.user)
+    return request._viewer
+
+
+def viewer_has(context, kind, pk):
+    viewer = get_viewer(context)
+    return viewer is not None and viewer.has(kind, pk)
+
+
+class ViewerListSerializer(serializers.ListSerializer):
+    """Регистрирует id страницы во Viewer до сериализации элементов"""
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        data = list(data)
+        viewer = get_viewer(self.context)
+        if viewer is not None:
+            self.child.register_viewer_ids(viewer, data)
+        return super().to_representation(data)
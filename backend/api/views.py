@@ -1,5 +1,11 @@
-from django.http import FileResponse
+import hmac
+import time
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import get_object_or_404
+from django.views.decorators.cache import never_cache
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
@@ -8,15 +14,41 @@ from rest_framework.response import Response
 from recipes.models import Ingredient, Recipe, Tag, Cart, Favorite
 from users.models import Follow, User
 
-from .filters import NameSearcher, RecipeFilter
-from .pagination import LimitPaginator
+from .cache import CachedResponseMixin, get_user_version, get_version
+from .conditional import ConditionalGetMixin
+from .db import ReplicaReadMixin
+from .exporters import EXPORT_FORMATS, stream_shopping_list
+from .filters import IngredientSearcher, RecipeFilter
+from .metrics import render_metrics
+from .pagination import FeedPaginator, LimitPaginator
 from .permissions import IsOwnerOrReadOnly
 from .serializers import (ChangePasswordSerializer, IngredientShowSerializer,
                           RecipeCreateSerializer, RecipeShowSerializer,
-                          RecipeSmallSerializer, SubscriptionSerializer,
-                          TagSerializer, UserCreateSerializer,
-                          UserShowSerializer)
-from .utils import create_or_delete_relation
+                          RecipeSmallSerializer, RelationIdsSerializer,
+                          SubscriptionSerializer, TagSerializer,
+                          UserCreateSerializer, UserShowSerializer)
+from .utils import (SELF_RELATION_ERROR, bulk_create_or_delete_relations,
+                    create_or_delete_relation)
+
+
+def popularity_bucket():
+    """Интервал времени, в течение которого порядок popular не меняется.
+
+    Избранное и корзина меняют только счётчики рецептов, но не версию
+    recipes, поэтому ETag и кеш списка с ordering=popular обновляются
+    раз в POPULAR_ORDERING_TTL секунд.
+    """
+    return str(int(time.time() // settings.POPULAR_ORDERING_TTL))
+
+
+def bulk_relations_response(model, request):
+    """Пакетное добавление или удаление связей с результатом по каждому id"""
+    serializer = RelationIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    results = bulk_create_or_delete_relations(
+        model, request.user, serializer.validated_data['ids'], request
+    )
+    return Response({'results': results}, status=status.HTTP_200_OK)
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -24,6 +56,7 @@ class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     permission_classes = (permissions.AllowAny,)
     pagination_class = LimitPaginator
+    cursor_ordering = ('-id',)
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
@@ -53,9 +86,21 @@ class UserViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'],
             permission_classes=(permissions.IsAuthenticated,),
-            pagination_class=LimitPaginator)
+            pagination_class=FeedPaginator)
     def subscriptions(self, request):
-        queryset = Follow.objects.filter(follower=request.user)
+        recipes = Recipe.objects.all()
+        limit = request.query_params.get('recipes_limit')
+        if limit and limit.isdigit():
+            recipes = recipes.latest_per_author(int(limit))
+        queryset = Follow.objects.filter(
+            follower=request.user
+        ).select_related('following').prefetch_related(
+            Prefetch(
+                'following__recipe_set',
+                queryset=recipes,
+                to_attr='latest_recipes'
+            )
+        ).order_by('-id')
         page = self.paginate_queryset(queryset)
         serializer = SubscriptionSerializer(
             page,
@@ -69,6 +114,11 @@ class UserViewSet(viewsets.ModelViewSet):
             url_path='subscribe')
     def subscribe(self, request, **kwargs):
         follower = request.user
+        if str(kwargs['pk']) == str(follower.pk):
+            return Response(
+                {'errors': SELF_RELATION_ERROR},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         following = get_object_or_404(User, id=kwargs['pk'])
         response = create_or_delete_relation(
             Follow, follower, following, request
@@ -82,35 +132,103 @@ class UserViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=response_status)
         return Response(response.get('string'), status=response_status)
 
+    @action(detail=False, methods=['post', 'delete'],
+            permission_classes=(permissions.IsAuthenticated,),
+            url_path='subscribe')
+    def subscribe_bulk(self, request):
+        return bulk_relations_response(Follow, request)
+
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(ConditionalGetMixin, CachedResponseMixin,
+                 viewsets.ModelViewSet):
+    cache_namespace = 'tags'
+    etag_namespaces = ('tags',)
     queryset = Tag.objects.all()
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
     pagination_class = None
     serializer_class = TagSerializer
 
 
-class IngredientsViewSet(viewsets.ModelViewSet):
+class IngredientsViewSet(ReplicaReadMixin, ConditionalGetMixin,
+                         CachedResponseMixin, viewsets.ModelViewSet):
+    cache_namespace = 'ingredients'
+    etag_namespaces = ('ingredients',)
     queryset = Ingredient.objects.all()
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
     pagination_class = None
     serializer_class = IngredientShowSerializer
-    filter_backends = (NameSearcher,)
-    search_fields = ('^name',)
+    filter_backends = (IngredientSearcher,)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
+class RecipeViewSet(ReplicaReadMixin, ConditionalGetMixin,
+                    CachedResponseMixin, viewsets.ModelViewSet):
+    cache_namespace = 'recipes'
+    cache_anonymous_only = True
+    etag_namespaces = ('recipes',)
     permission_classes = (IsOwnerOrReadOnly,)
-    pagination_class = LimitPaginator
+    pagination_class = FeedPaginator
+    cursor_ordering = ('-pub_date', '-id')
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        queryset = Recipe.objects.all()
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.with_related(self.request.user)
+        return queryset
+
+    def is_popular_ordering(self, request):
+        return (self.action == 'list'
+                and request.query_params.get('ordering') == 'popular')
+
+    def get_cache_key(self, request):
+        key = super().get_cache_key(request)
+        if self.is_popular_ordering(request):
+            key += f':{popularity_bucket()}'
+        return key
+
+    def get_etag_parts(self, request, **kwargs):
+        if self.action != 'retrieve':
+            parts = super().get_etag_parts(request, **kwargs)
+            if self.is_popular_ordering(request):
+                parts.append(popularity_bucket())
+            return parts
+        parts = [
+            request.get_full_path(),
+            str(get_version('tags')),
+            str(get_version('ingredients')),
+            str(self.get_last_modified(request, **kwargs)),
+        ]
+        if request.user.is_authenticated:
+            parts.append(str(get_user_version(request.user.id)))
+        return parts
+
+    def get_last_modified(self, request, **kwargs):
+        if self.action != 'retrieve' or not str(kwargs.get('pk')).isdigit():
+            return None
+        if not hasattr(self, '_last_modified'):
+            self._last_modified = Recipe.objects.filter(
+                pk=kwargs.get('pk')
+            ).values_list('updated_at', flat=True).first()
+        return self._last_modified
+
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
             return RecipeShowSerializer
         return RecipeCreateSerializer
 
+    @action(detail=False, methods=('GET',),
+            pagination_class=LimitPaginator)
+    def trending(self, request):
+        queryset = Recipe.objects.trending().with_related(request.user)
+        page = self.paginate_queryset(queryset)
+        serializer = RecipeShowSerializer(
+            page,
+            many=True,
+            context={'request': request}
+        )
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=(permissions.IsAuthenticated,))
     def shopping_cart(self, request, **kwargs):
@@ -127,6 +245,12 @@ class RecipeViewSet(viewsets.ModelViewSet):
             )
         return Response(response.get('string'), status=response_status)
 
+    @action(detail=False, methods=['post', 'delete'],
+            permission_classes=(permissions.IsAuthenticated,),
+            url_path='shopping_cart')
+    def shopping_cart_bulk(self, request):
+        return bulk_relations_response(Cart, request)
+
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=(permissions.IsAuthenticated,))
     def favorite(self, request, **kwargs):
@@ -143,11 +267,42 @@ class RecipeViewSet(viewsets.ModelViewSet):
             )
         return Response(response.get('string'), status=response_status)
 
+    @action(detail=False, methods=['post', 'delete'],
+            permission_classes=(permissions.IsAuthenticated,),
+            url_path='favorite')
+    def favorite_bulk(self, request):
+        return bulk_relations_response(Favorite, request)
+
     @action(detail=False, methods=('GET',),
             permission_classes=(permissions.IsAuthenticated,),
             url_path='download_shopping_cart')
     def download_shopping_cart(self, request):
+        export_format = request.query_params.get('type', 'txt')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'errors': 'unsupported format, use one of: '
+                 + ', '.join(EXPORT_FORMATS)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         queryset = Cart.create_grocery_queryset(request.user)
-        response = FileResponse(queryset.getvalue(), content_type='text/plain')
-        response['Content-Disposition'] = 'attachment; filename="cart.txt"'
-        return response
+        return stream_shopping_list(queryset, export_format)
+
+
+def metrics_allowed(request):
+    """Метрики видны адресам из METRICS_ALLOWED_IPS или по METRICS_TOKEN"""
+    if request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+        return True
+    token = settings.METRICS_TOKEN
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and hmac.compare_digest(
+        authorization.encode(), f'Bearer {token}'.encode()
+    )
+
+
+@never_cache
+def metrics(request):
+    """Метрики в текстовом формате Prometheus"""
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
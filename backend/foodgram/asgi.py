@@ -0,0 +1,69 @@
+"""
+ASGI config for foodgram project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Run it with uvicorn, e.g.
+``gunicorn foodgram.asgi:application -k uvicorn.workers.UvicornWorker``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+"""
+
+import os
+from itertools import islice
+
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+os.environ.setdefault('ASYNC_VIEWS', '1')
+
+# Частей потокового ответа за один переход в поток запроса
+STREAMING_BATCH = 100
+
+
+class FoodgramASGIHandler(ASGIHandler):
+    """ASGIHandler, отдающий потоковые ответы без обращений к базе в цикле.
+
+    Django 3.2 перебирает части потокового ответа прямо в цикле событий,
+    а выгрузка списка покупок читает базу курсором. Части собираются
+    пачками в том же потоке, где выполнялся view.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        headers = [
+            (str(header).encode('ascii'), str(value).encode('latin1'))
+            for header, value in response.items()
+        ]
+        headers += [
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            for cookie in response.cookies.values()
+        ]
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+        parts = iter(response)
+        take = sync_to_async(
+            lambda: list(islice(parts, STREAMING_BATCH)),
+            thread_sensitive=True,
+        )
+        while True:
+            batch = await take()
+            if not batch:
+                break
+            await send({
+                'type': 'http.response.body',
+                'body': b''.join(batch),
+                'more_body': True,
+            })
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+django.setup(set_prefix=False)
+application = FoodgramASGIHandler()
@@ -0,0 +1,106 @@
+"""PostgreSQL с пулом соединений внутри процесса.
+
+Для потоковых воркеров (ASGI, gthread): соединения берутся из общего
+пула процесса и возвращаются в него, когда Django закрывает соединение
+в конце запроса. Размеры пула задаются ключом POOL в настройках базы.
+"""
+import threading
+
+import psycopg2.extras
+from django.db.backends.postgresql import base
+from django.utils.asyncio import async_unsafe
+from psycopg2.pool import ThreadedConnectionPool
+
+Database = base.Database
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class BlockingPool:
+    """ThreadedConnectionPool, который ждёт свободное соединение.
+
+    Исходный пул сразу бросает PoolError, когда соединения кончились;
+    здесь поток ждёт до timeout секунд.
+    """
+
+    def __init__(self, min_size, max_size, timeout, conn_params):
+        self.pool = ThreadedConnectionPool(min_size, max_size, **conn_params)
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.timeout = timeout
+
+    def getconn(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise Database.OperationalError('connection pool exhausted')
+        try:
+            return self.pool.getconn()
+        except Exception:
+            self.slots.release()
+            raise
+
+    def putconn(self, connection, close=False):
+        try:
+            self.pool.putconn(connection, close=close)
+        finally:
+            self.slots.release()
+
+
+def get_pool(alias, settings_dict, conn_params):
+    with _pools_lock:
+        if alias not in _pools:
+            options = settings_dict.get('POOL', {})
+            _pools[alias] = BlockingPool(
+                options.get('MIN_SIZE', 1),
+                options.get('MAX_SIZE', 10),
+                options.get('TIMEOUT', 10),
+                conn_params,
+            )
+        return _pools[alias]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def pool(self):
+        return get_pool(
+            self.alias, self.settings_dict, self.get_connection_params()
+        )
+
+    def checkout(self):
+        """Берём соединение из пула, отбрасывая разорванные"""
+        while True:
+            connection = self.pool.getconn()
+            if connection.closed:
+                self.pool.putconn(connection, close=True)
+                continue
+            if not self.settings_dict.get('CONN_HEALTH_CHECKS'):
+                return connection
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                connection.rollback()
+                return connection
+            except Database.Error:
+                self.pool.putconn(connection, close=True)
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        connection = self.checkout()
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get(
+            'isolation_level', connection.isolation_level
+        )
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(
+            conn_or_curs=connection, loads=lambda x: x
+        )
+        return connection
+
+    @async_unsafe
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(
+                    self.connection, close=bool(self.connection.closed)
+                )
@@ -37,6 +37,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.PrometheusMiddleware',
+    'api.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,17 +68,52 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+# Соединения с базой: постоянные с проверкой перед запросом или, с
+# DB_ENGINE=foodgram.postgresql_pool, из пула процесса - тогда Django
+# возвращает соединение в пул в конце каждого запроса
+DB_ENGINE = os.getenv('DB_ENGINE', default='django.db.backends.postgresql')
+DB_POOLED = DB_ENGINE == 'foodgram.postgresql_pool'
+
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE', default='django.db.backends.postgresql'),
+        'ENGINE': DB_ENGINE,
         'NAME': os.getenv('DB_NAME', default='postgres'),
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default=5432)
+        'PORT': os.getenv('DB_PORT', default=5432),
+        'CONN_MAX_AGE': (
+            0 if DB_POOLED else int(os.getenv('DB_CONN_MAX_AGE', default=60))
+        ),
+        'CONN_HEALTH_CHECKS': (
+            os.getenv('DB_CONN_HEALTH_CHECKS', default='1') == '1'
+        ),
+        # Для PgBouncer в режиме пула транзакций: iterator() выгрузки
+        # списка покупок иначе держит курсор на сервере между запросами
+        'DISABLE_SERVER_SIDE_CURSORS': (
+            os.getenv('DB_DISABLE_SERVER_SIDE_CURSORS', default='') == '1'
+        ),
+        'POOL': {
+            'MIN_SIZE': int(os.getenv('DB_POOL_MIN_SIZE', default=1)),
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', default=10)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', default=10)),
+        },
     }
 }
 
+# Реплика для чтения: задайте DB_REPLICA_HOST (или DB_REPLICA_NAME для
+# второй базы SQLite); остальные параметры берутся из основной базы
+if os.getenv('DB_REPLICA_HOST') or os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['api.db.ReplicaRouter']
+# Сколько секунд после записи пользователь читает с основной базы
+DB_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', default=5))
+
 #DATABASES = {
 #    'default': {
 #        'ENGINE': 'django.db.backends.sqlite3',
@@ -123,6 +160,8 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Адрес CDN перед медиафайлами, например https://cdn.example.com/media/
+MEDIA_CDN_URL = os.getenv('MEDIA_CDN_URL', default='')
 
 AUTH_USER_MODEL = "users.User"
 
@@ -143,6 +182,83 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10,
 }
 
+# Изображения рецептов
+RECIPE_IMAGE_MAX_BYTES = int(
+    os.getenv('RECIPE_IMAGE_MAX_BYTES', default=5 * 1024 * 1024)
+)
+RECIPE_IMAGE_MAX_SIDE = int(os.getenv('RECIPE_IMAGE_MAX_SIDE', default=4096))
+RECIPE_THUMBNAIL_SIZES = (320, 640)
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', default=2))
+
+# Кеш ответов API: локальная память по умолчанию, годится только для
+# одного процесса. С GUNICORN_WORKERS>1 нужен общий кеш, например
+# CACHE_BACKEND=django_redis.cache.RedisCache
+# CACHE_LOCATION=redis://redis:6379/1
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', default=600))
+
+# Как долго список рецептов с ordering=popular может отставать от
+# счётчиков избранного и корзины
+POPULAR_ORDERING_TTL = int(os.getenv('POPULAR_ORDERING_TTL', default=60))
+
+# Подсчёт объектов для постраничной пагинации
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', default=30)
+)
+PAGINATION_ESTIMATE_THRESHOLD = int(
+    os.getenv('PAGINATION_ESTIMATE_THRESHOLD', default=100000)
+)
+
+# Асинхронные view чтения; foodgram/asgi.py включает их по умолчанию
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', default='') == '1'
+
+# Наибольшее число id в пакетных запросах избранного, корзины и подписок
+RELATIONS_BULK_LIMIT = int(os.getenv('RELATIONS_BULK_LIMIT', default=100))
+
+# Поиск ингредиентов по префиксу названия
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', default=50))
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', default=300))
+
+# Замеры запросов: Server-Timing и журнал api.middleware
+REQUEST_TIMING = os.getenv('REQUEST_TIMING', default='') == '1'
+REQUEST_TIMING_SLOW_MS = int(os.getenv('REQUEST_TIMING_SLOW_MS', default=500))
+REQUEST_TIMING_MAX_QUERIES = int(
+    os.getenv('REQUEST_TIMING_MAX_QUERIES', default=20)
+)
+REQUEST_TIMING_TOP_QUERIES = 5
+
+# Метрики Prometheus на /api/metrics. Каталог метрик нескольких воркеров
+# PROMETHEUS_MULTIPROC_DIR задаёт серверу gunicorn.conf.py
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', default='1') == '1'
+# Кому отдавать /api/metrics: адреса через запятую (адрес nginx сюда не
+# добавляйте, иначе метрики увидят все) или заголовок
+# Authorization: Bearer <METRICS_TOKEN>
+METRICS_ALLOWED_IPS = [
+    address.strip() for address in os.getenv(
+        'METRICS_ALLOWED_IPS', default='127.0.0.1'
+    ).split(',') if address.strip()
+]
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.middleware': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
 }
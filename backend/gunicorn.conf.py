@@ -0,0 +1,54 @@
+import os
+import shutil
+import time
+
+bind = '0:8000'
+
+# ASGI=1 - асинхронный режим: foodgram.asgi под воркерами uvicorn
+if os.getenv('ASGI') == '1':
+    wsgi_app = 'foodgram.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram.wsgi:application'
+
+workers = int(os.getenv('GUNICORN_WORKERS', default=1))
+
+# Версии кеша ответов, ETag и закрепления за основной базой должны быть
+# общими для всех воркеров, иначе сброс в одном воркере не виден другим
+LOCAL_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+
+# Общий каталог метрик задаётся только процессам сервера: management-
+# команды в том же контейнере держат метрики в памяти и не оставляют
+# файлов, которые выглядели бы как живые воркеры
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus')
+
+
+def on_starting(server):
+    """Проверяем кеш и очищаем каталог метрик от файлов прошлого запуска"""
+    if (server.cfg.workers > 1
+            and os.getenv('CACHE_BACKEND', LOCAL_CACHE) == LOCAL_CACHE):
+        raise RuntimeError(
+            'several workers need a shared cache, set CACHE_BACKEND '
+            'and CACHE_LOCATION (e.g. Redis) or GUNICORN_WORKERS=1'
+        )
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def post_fork(server, worker):
+    """Ряд метрики на каждый живой воркер"""
+    from prometheus_client import Gauge
+
+    Gauge(
+        'foodgram_worker_start_time_seconds',
+        'Время запуска воркера; число рядов - число живых воркеров',
+        multiprocess_mode='liveall',
+    ).set(time.time())
+
+
+def child_exit(server, worker):
+    """Метрики-датчики завершившегося воркера больше не отдаём"""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
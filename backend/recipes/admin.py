@@ -10,8 +10,9 @@ class RecipeAdmin(admin.ModelAdmin):
     list_filter = ('name', 'author', 'tags')
     empty_value_display = '-пусто-'
 
+    @admin.display(description='В избранном')
     def favorited(self, obj):
-        return obj.favorites_recipe.count()
+        return obj.favorites_count
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -42,10 +43,11 @@ class UserAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'first_name', 'last_name', 'is_staff')
 
 
-admin.site.register(models.Recipe)
+admin.site.register(models.Recipe, RecipeAdmin)
 admin.site.register(models.Tag)
 admin.site.register(models.Ingredient)
 admin.site.register(models.RecipeIngredient)
 admin.site.register(models.Favorite)
 admin.site.register(models.Cart)
+admin.site.register(models.ShoppingListItem)
 admin.site.register(User)
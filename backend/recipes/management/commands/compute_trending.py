@@ -0,0 +1,68 @@
+import heapq
+import time
+from collections import defaultdict
+from datetime import timedelta
+from operator import itemgetter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.models import Cart, Favorite, Recipe, RecipeTrend
+
+
+class Command(BaseCommand):
+    help = ('Recalculate the trending recipes ranking from recent '
+            'favorites and carts with exponential time decay.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--half-life', type=float, default=48,
+            help='Hours after which an action weighs half as much.'
+        )
+        parser.add_argument(
+            '--window', type=int, default=14,
+            help='Days of activity to take into account.'
+        )
+        parser.add_argument(
+            '--top', type=int, default=500,
+            help='Number of recipes to keep in the ranking.'
+        )
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Repeat every N seconds instead of running once.'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.compute(
+                options['half_life'], options['window'], options['top']
+            )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def compute(self, half_life, window, top):
+        now = timezone.now()
+        since = now - timedelta(days=window)
+        scores = defaultdict(float)
+        for model in (Favorite, Cart):
+            actions = model.objects.filter(
+                created_at__gte=since
+            ).values_list('recipe_id', 'created_at')
+            for recipe_id, created_at in actions.iterator():
+                age = (now - created_at).total_seconds() / 3600
+                scores[recipe_id] += 0.5 ** (age / half_life)
+        ranked = heapq.nlargest(top, scores.items(), key=itemgetter(1))
+        existing = set(Recipe.objects.filter(
+            pk__in=[recipe_id for recipe_id, _ in ranked]
+        ).values_list('pk', flat=True))
+        with transaction.atomic():
+            RecipeTrend.objects.all().delete()
+            RecipeTrend.objects.bulk_create(
+                RecipeTrend(recipe_id=recipe_id, score=score, computed_at=now)
+                for recipe_id, score in ranked if recipe_id in existing
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'trending ranking updated: {len(existing)} recipes'
+        ))
@@ -1,19 +1,111 @@
+import csv
+import io
 import json
+import time
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
 from recipes.models import Ingredient
 
 
+def read_json(file):
+    # В стандартной библиотеке нет потокового парсера JSON,
+    # файл с массивом объектов читается целиком.
+    for row in json.load(file):
+        yield row['name'], row['measurement_unit']
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0], row[1]
+
+
+READERS = {
+    'json': read_json,
+    'csv': read_csv,
+}
+
+
 class Command(BaseCommand):
-    help = 'Load ingredients data from csv-file to DB.'
-
-    def handle(self, *args, **kwargs):
-        with open(
-                'ingredients.json', 'r',
-                encoding='UTF-8'
-        ) as ingredients:
-            ingredient_data = json.loads(ingredients.read())
-            for ingredients in ingredient_data:
-                Ingredient.objects.get_or_create(**ingredients)
-        self.stdout.write(self.style.SUCCESS('ingredients data uploaded'))
+    help = 'Load ingredients data from json- or csv-file to DB.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=Path(settings.BASE_DIR) / 'ingredients.json',
+        )
+        parser.add_argument(
+            '--format', choices=READERS,
+            help='File format, detected by extension by default.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Use PostgreSQL COPY instead of bulk INSERT.'
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'unknown file format: {path.name}')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy requires PostgreSQL')
+        load = self.copy_batch if options['copy'] else self.insert_batch
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+        before = Ingredient.objects.count()
+        seen = set()
+        batch = []
+        rows = 0
+        with path.open(encoding='UTF-8') as file, transaction.atomic():
+            for name, unit in READERS[file_format](file):
+                rows += 1
+                key = (name.strip(), unit.strip())
+                if not all(key) or key in seen:
+                    continue
+                seen.add(key)
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    load(batch)
+                    batch = []
+            if batch:
+                load(batch)
+        elapsed = time.perf_counter() - started
+        created = Ingredient.objects.count() - before
+        self.stdout.write(self.style.SUCCESS(
+            f'ingredients data uploaded: {rows} rows read, '
+            f'{len(seen)} unique, {created} created, '
+            f'{rows / elapsed if elapsed else rows:.0f} rows/sec'
+        ))
+
+    def insert_batch(self, batch):
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=unit)
+             for name, unit in batch),
+            ignore_conflicts=True,
+        )
+
+    def copy_batch(self, batch):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE IF NOT EXISTS ingredients_import '
+                '(name text, measurement_unit text)'
+            )
+            cursor.copy_expert(
+                'COPY ingredients_import FROM STDIN WITH CSV', buffer
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT name, measurement_unit FROM ingredients_import '
+                'ON CONFLICT DO NOTHING'
+            )
+            cursor.execute('TRUNCATE ingredients_import')
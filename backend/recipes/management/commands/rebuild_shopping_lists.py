@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Rebuild aggregated shopping lists from carts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='Rebuild only lists of the given user ids.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            ShoppingListItem.objects.rebuild(options['users'])
+        self.stdout.write(self.style.SUCCESS(
+            f'shopping lists rebuilt: {ShoppingListItem.objects.count()} '
+            'items'
+        ))
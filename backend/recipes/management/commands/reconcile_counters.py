@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Cart, Favorite, Recipe
+from users.models import Follow, User
+
+
+def count_of(model, field):
+    """Подзапрос с числом строк model, ссылающихся на внешнюю строку"""
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = 'Recalculate denormalized recipe and user counters.'
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            recipes = Recipe.objects.update(
+                favorites_count=count_of(Favorite, 'recipe'),
+                carts_count=count_of(Cart, 'recipe'),
+            )
+            users = User.objects.update(
+                recipes_count=count_of(Recipe, 'author'),
+                followers_count=count_of(Follow, 'following'),
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'counters reconciled: {recipes} recipes, {users} users'
+        ))
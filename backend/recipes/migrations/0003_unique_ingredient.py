@@ -0,0 +1,56 @@
+# Generated by Django 3.2.20 on 2026-10-18 19:48
+
+from django.db import migrations, models
+
+
+def merge_rows(model, owner, kept_id, duplicate_ids):
+    """Переносим строки на оставленный ингредиент, суммируя повторы"""
+    for row in model.objects.filter(ingredient_id__in=duplicate_ids):
+        existing = model.objects.filter(
+            **{owner: getattr(row, owner)}, ingredient_id=kept_id
+        ).first()
+        if existing is None:
+            row.ingredient_id = kept_id
+            row.save(update_fields=['ingredient'])
+        else:
+            existing.amount += row.amount
+            existing.save(update_fields=['amount'])
+            row.delete()
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        kept_id=models.Min('id'), total=models.Count('id')
+    ).filter(total__gt=1).order_by()
+    for group in duplicates:
+        duplicate_ids = list(Ingredient.objects.filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit'],
+        ).exclude(id=group['kept_id']).values_list('id', flat=True))
+        merge_rows(RecipeIngredient, 'recipe_id', group['kept_id'],
+                   duplicate_ids)
+        merge_rows(ShoppingListItem, 'user_id', group['kept_id'],
+                   duplicate_ids)
+        Ingredient.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.20 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipeingredient_lookup_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_thumb',
+            field=models.ImageField(blank=True, editable=False, upload_to='uploads/recipes/thumbs', verbose_name='Миниатюра'),
+        ),
+    ]
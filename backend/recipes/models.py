@@ -1,8 +1,12 @@
-from io import StringIO
 from autoslug import AutoSlugField
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, SearchVectorField)
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
+from django.db import connections, models
+from django.db.models.functions import Greatest
+
+from users.models import Follow
 
 User = get_user_model()
 
@@ -54,11 +58,97 @@ class Ingredient(models.Model):
         ordering = ['name']
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient',
+            )
+        ]
 
     def __str__(self):
         return self.name
 
 
+POPULARITY = models.F('favorites_count') + models.F('carts_count')
+SEARCH_CONFIG = 'russian'
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Запросы рецептов для выдачи списком без N+1"""
+
+    def with_related(self, user):
+        """Связи и флаги пользователя фиксированным числом запросов"""
+        authors = User.objects.all()
+        queryset = self
+        if user.is_authenticated:
+            authors = authors.annotate(
+                is_subscribed=models.Exists(Follow.objects.filter(
+                    follower=user,
+                    following=models.OuterRef('pk')
+                ))
+            )
+            queryset = queryset.annotate(
+                is_favorited=models.Exists(Favorite.objects.filter(
+                    user=user,
+                    recipe=models.OuterRef('pk')
+                )),
+                is_in_shopping_cart=models.Exists(Cart.objects.filter(
+                    user=user,
+                    recipe=models.OuterRef('pk')
+                )),
+            )
+        return queryset.defer('search_vector').prefetch_related(
+            'tags',
+            models.Prefetch('author', queryset=authors),
+            models.Prefetch(
+                'recipes',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        )
+
+    def latest_per_author(self, limit):
+        """Не больше limit последних рецептов каждого автора"""
+        return self.filter(id__in=models.Subquery(
+            Recipe.objects.filter(
+                author=models.OuterRef('author')
+            ).values('id')[:limit]
+        ))
+
+    def popular(self):
+        return self.order_by(POPULARITY.desc(), '-pub_date')
+
+    def is_postgresql(self):
+        return connections[self.db].vendor == 'postgresql'
+
+    def update_search_vector(self):
+        """Пересчитываем поисковый вектор, только в PostgreSQL"""
+        if not self.is_postgresql():
+            return 0
+        return self.update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+        ))
+
+    def search(self, text):
+        """Полнотекстовый поиск с ранжированием, в SQLite - по вхождению"""
+        if not self.is_postgresql():
+            return self.filter(
+                models.Q(name__icontains=text)
+                | models.Q(text__icontains=text)
+            )
+        query = SearchQuery(
+            text, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return self.filter(search_vector=query).annotate(
+            rank=SearchRank(models.F('search_vector'), query)
+        ).order_by('-rank', '-pub_date')
+
+    def trending(self):
+        return self.filter(
+            trend__isnull=False
+        ).order_by('-trend__score', '-pub_date')
+
+
 class Recipe(models.Model):
     """Модель рецепта"""
     author = models.ForeignKey(
@@ -74,6 +164,12 @@ class Recipe(models.Model):
         verbose_name='Изображение',
         upload_to='uploads/recipes',
     )
+    image_thumb = models.ImageField(
+        verbose_name='Миниатюра',
+        upload_to='uploads/recipes/thumbs',
+        blank=True,
+        editable=False,
+    )
     text = models.TextField(
         verbose_name='Описание',
         max_length=400,
@@ -96,11 +192,40 @@ class Recipe(models.Model):
         auto_now_add=True,
         db_index=True,
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    carts_count = models.PositiveIntegerField(
+        verbose_name='В корзинах',
+        default=0,
+        editable=False,
+    )
+    # GIN-индекс создаётся миграцией только в PostgreSQL
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                POPULARITY.desc(),
+                models.F('pub_date').desc(),
+                name='recipe_popularity_idx',
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -134,6 +259,12 @@ class RecipeIngredient(models.Model):
                 name='unique_combination',
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['ingredient', 'recipe'],
+                name='recipeingredient_lookup_idx',
+            )
+        ]
 
 
 class Favorite(models.Model):
@@ -150,6 +281,11 @@ class Favorite(models.Model):
         related_name='favorites',
         verbose_name='Рецепт'
     )
+    created_at = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'Избранное'
@@ -176,6 +312,11 @@ class Cart(models.Model):
         related_name='carts',
         verbose_name='Рецепт'
     )
+    created_at = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'Корзина'
@@ -188,17 +329,139 @@ class Cart(models.Model):
         ]
 
     def create_grocery_queryset(user):
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__carts__user=user
+        return ShoppingListItem.objects.filter(
+            user=user
         ).values(
             'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(
-            amount=models.Sum('amount')
+            'ingredient__measurement_unit',
+            'amount',
+        ).order_by('ingredient__name')
+
+
+class RecipeTrend(models.Model):
+    """Рейтинг популярности рецепта, пересчитываемый фоновой задачей"""
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trend',
+        verbose_name='Рецепт'
+    )
+    score = models.FloatField(
+        verbose_name='Рейтинг',
+        db_index=True,
+    )
+    computed_at = models.DateTimeField(
+        verbose_name='Дата расчёта',
+    )
+
+    class Meta:
+        ordering = ['-score']
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+
+
+class ShoppingListQuerySet(models.QuerySet):
+    """Инкрементальное обновление суммарных списков покупок"""
+
+    @staticmethod
+    def _recipe_amounts(recipes):
+        return dict(RecipeIngredient.objects.filter(
+            recipe__in=recipes
+        ).values_list('ingredient_id').annotate(
+            total=models.Sum('amount')
+        ).order_by())
+
+    @staticmethod
+    def _amount_case(amounts):
+        return models.Case(
+            *(models.When(ingredient_id=pk, then=models.Value(amount))
+              for pk, amount in amounts.items()),
+            default=models.Value(0),
+            output_field=models.PositiveIntegerField(),
         )
-        buffer = StringIO()
-        for item in ingredients:
-            buffer.write(f"{item['ingredient__name']}\t")
-            buffer.write(f"{item['amount']}\t")
-            buffer.write(f"{item['ingredient__measurement_unit']}\n")
-        return buffer
+
+    def add_recipes(self, recipes, user_ids):
+        """Прибавляем ингредиенты рецептов к спискам пользователей"""
+        amounts = self._recipe_amounts(recipes)
+        if not amounts or not user_ids:
+            return
+        self.bulk_create(
+            (ShoppingListItem(user_id=user_id, ingredient_id=pk)
+             for user_id in user_ids for pk in amounts),
+            ignore_conflicts=True,
+        )
+        self.filter(
+            user_id__in=user_ids,
+            ingredient_id__in=amounts,
+        ).update(amount=models.F('amount') + self._amount_case(amounts))
+
+    def remove_recipes(self, recipes, user_ids):
+        """Вычитаем ингредиенты рецептов из списков пользователей"""
+        amounts = self._recipe_amounts(recipes)
+        if not amounts or not user_ids:
+            return
+        items = self.filter(user_id__in=user_ids, ingredient_id__in=amounts)
+        items.update(amount=Greatest(
+            models.F('amount') - self._amount_case(amounts),
+            models.Value(0),
+        ))
+        items.filter(amount=0).delete()
+
+    def rebuild(self, user_ids=None):
+        """Пересчитываем списки заново по корзинам"""
+        if user_ids is None:
+            carted = RecipeIngredient.objects.filter(
+                recipe__carts__isnull=False
+            )
+            items = self.all()
+        else:
+            carted = RecipeIngredient.objects.filter(
+                recipe__carts__user__in=user_ids
+            )
+            items = self.filter(user__in=user_ids)
+        totals = carted.values(
+            'recipe__carts__user',
+            'ingredient',
+        ).annotate(total=models.Sum('amount')).order_by()
+        items.delete()
+        self.bulk_create(
+            (ShoppingListItem(
+                user_id=row['recipe__carts__user'],
+                ingredient_id=row['ingredient'],
+                amount=row['total'],
+            ) for row in totals.iterator()),
+            batch_size=1000,
+        )
+
+
+class ShoppingListItem(models.Model):
+    """Модель суммарного списка покупок по рецептам из корзины"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент'
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name='Количество',
+        default=0,
+    )
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item',
+            )
+        ]
@@ -0,0 +1,136 @@
+"""Нагрузочный тест API без сторонних зависимостей.
+
+Держит заданное число одновременных соединений, каждое отправляет GET
+по кругу, и печатает пропускную способность и задержки. Медленные
+клиенты (--slow-clients) передают запрос по байту, как на плохой сети:
+синхронный воркер gunicorn ждёт каждого из них целиком, а ASGI-сервер
+продолжает обслуживать остальных.
+
+Сравнение WSGI и ASGI на одном ядре:
+
+    gunicorn foodgram.wsgi:application -w 1 -b 127.0.0.1:8001
+    gunicorn foodgram.asgi:application -w 1 -b 127.0.0.1:8002 \\
+        -k uvicorn.workers.UvicornWorker
+    python scripts/loadtest.py http://127.0.0.1:8001/api/recipes/ \\
+        http://127.0.0.1:8002/api/recipes/ --slow-clients 5
+"""
+import argparse
+import asyncio
+import math
+import time
+from urllib.parse import urlsplit
+
+
+def build_request(url, headers):
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path += f'?{parts.query}'
+    lines = [f'GET {path} HTTP/1.1', f'Host: {parts.netloc}']
+    lines += headers
+    return parts.hostname, parts.port or 80, (
+        '\r\n'.join(lines) + '\r\n\r\n'
+    ).encode()
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    headers = head.lower()
+    if b'transfer-encoding: chunked' in headers:
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        length = 0
+        for line in headers.split(b'\r\n'):
+            if line.startswith(b'content-length:'):
+                length = int(line.split(b':')[1])
+        await reader.readexactly(length)
+    return status, b'connection: close' not in headers
+
+
+async def client(host, port, request, deadline, latencies, errors):
+    reader = writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            start = time.monotonic()
+            writer.write(request)
+            status, keep_alive = await read_response(reader)
+            latencies.append(time.monotonic() - start)
+            if status >= 400:
+                errors.append(status)
+            if not keep_alive:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, ValueError) as error:
+            errors.append(type(error).__name__)
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def slow_client(host, port, request, deadline, delay):
+    """Отправляем запрос по байту, занимая соединение до конца теста"""
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            for byte in request:
+                writer.write(bytes((byte,)))
+                await writer.drain()
+                await asyncio.sleep(delay)
+                if time.monotonic() >= deadline:
+                    break
+            writer.close()
+        except OSError:
+            await asyncio.sleep(delay)
+
+
+def percentile(values, p):
+    """Перцентиль по ближайшему рангу из отсортированного списка"""
+    rank = max(math.ceil(len(values) * p / 100), 1)
+    return values[rank - 1]
+
+
+async def run(url, options):
+    host, port, request = build_request(url, options.header)
+    deadline = time.monotonic() + options.duration
+    latencies, errors = [], []
+    await asyncio.gather(
+        *(client(host, port, request, deadline, latencies, errors)
+          for _ in range(options.concurrency)),
+        *(slow_client(host, port, request, deadline, options.slow_delay)
+          for _ in range(options.slow_clients)),
+    )
+    latencies.sort()
+    print(url)
+    print(f'  запросов: {len(latencies)}, ошибок: {len(errors)}')
+    print(f'  в секунду: {len(latencies) / options.duration:.1f}')
+    if latencies:
+        print('  задержка, мс: p50 {:.1f}, p95 {:.1f}, p99 {:.1f}'.format(
+            *(percentile(latencies, p) * 1000 for p in (50, 95, 99))
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('urls', nargs='+', help='адреса для сравнения')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--slow-clients', type=int, default=0)
+    parser.add_argument('--slow-delay', type=float, default=0.5,
+                        help='пауза между байтами медленного клиента')
+    parser.add_argument('--header', action='append', default=[],
+                        help='дополнительный заголовок, например '
+                             '"Authorization: Token ..."')
+    options = parser.parse_args()
+    for url in options.urls:
+        asyncio.run(run(url, options))
+
+
+if __name__ == '__main__':
+    main()
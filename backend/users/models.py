@@ -24,6 +24,16 @@ class User(AbstractUser):
     last_name = models.TextField(
         max_length=100,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков',
+        default=0,
+        editable=False,
+    )
 
     def __str__(self):
         return self.username
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 
-from .models import Follow, User
+from api.viewer import ViewerListSerializer, viewer_has
+
+from .models import User
 
 
 class UserShowSerializer(serializers.ModelSerializer):
@@ -17,15 +19,14 @@ class UserShowSerializer(serializers.ModelSerializer):
             'last_name',
             'is_subscribed',
         )
+        list_serializer_class = ViewerListSerializer
+
+    def register_viewer_ids(self, viewer, users):
+        viewer.register('follows', [user.pk for user in users])
+
     """Проверяем статус подписки на пользователя"""
     def get_is_subscribed(self, obj):
-        if (self.context.get('request')
-           and self.context['request'].user.is_authenticated):
-            return Follow.objects.filter(
-                follower=self.context['request'].user,
-                following=obj
-            ).exists()
-        return False
+        return viewer_has(self.context, 'follows', obj.pk)
 
 
 class UserCreateSerializer(serializers.ModelSerializer):